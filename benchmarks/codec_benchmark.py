@@ -0,0 +1,69 @@
+"""
+购物车 / 结算数据编码的对比
+    python benchmarks/codec_benchmark.py
+对比旧的 json 结构 (每个课程一份 price_dict) 和 utils.codec 的每个课程的字节数以及编解码耗时
+"""
+import os
+import sys
+import json
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import codec  # noqa
+
+NUMBER = 100000
+
+# 旧结构: 购物车中的每个课程都保存了完整的价格策略
+old_cart_item = {
+    "course_id": 1,
+    "course_title": "python全栈课程",
+    "default_price_policy_id": 1,
+    "price_dict": {
+        "1": {"price": 10000.0, "valid_period": 722, "valid_period_id": "24个月"},
+        "2": {"price": 100.0, "valid_period": 120, "valid_period_id": "4个月"},
+        "3": {"price": 40000.0, "valid_period": 180, "valid_period_id": "6个月"},
+    },
+}
+cart_item = {"default_price_policy_id": 1, "price_version": 3}
+
+coupon = {
+    "name": "双十一立减",
+    "valid_end_date": "立减券",
+    "coupon_type": "立减券",
+    "minimum_consume": 0,
+    "money_equivalent_value": 50,
+    "off_percent": None,
+}
+account_item = {
+    "course_info": dict(old_cart_item, price_version=3, price_changed=False),
+    "course_coupon_info": {1: coupon, 2: coupon, 3: coupon},
+}
+
+
+def old_loads(data):
+    """旧的 tran_str, 先尝试 json.loads, 失败再当作字符串"""
+    try:
+        return json.loads(data.decode("utf-8"))
+    except Exception:
+        return data.decode("utf-8")
+
+
+def bench(name, dumps, loads, value):
+    data = dumps(value)
+    encode = timeit.timeit(lambda: dumps(value), number=NUMBER) / NUMBER * 1e6
+    decode = timeit.timeit(lambda: loads(data), number=NUMBER) / NUMBER * 1e6
+    print("{:<28}{:>8}{:>14.2f}{:>14.2f}".format(name, len(data), encode, decode))
+
+
+def main():
+    print("{:<28}{:>8}{:>14}{:>14}".format("", "bytes", "encode(us)", "decode(us)"))
+    json_dumps = lambda value: json.dumps(value).encode("utf-8")  # noqa
+    bench("cart item: old json", json_dumps, old_loads, old_cart_item)
+    bench("cart item: struct", codec.cart_item_codec.dumps, codec.loads, cart_item)
+    bench("account item: old json", json_dumps, old_loads, account_item)
+    bench("account item: msgpack", codec.msgpack_codec.dumps, codec.loads, account_item)
+
+
+if __name__ == "__main__":
+    main()
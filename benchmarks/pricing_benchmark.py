@@ -0,0 +1,52 @@
+"""
+结算最优优惠券组合的耗时
+    python benchmarks/pricing_benchmark.py
+50门课程, 100张优惠券(80张课程优惠券随机绑定课程, 20张通用优惠券)
+"""
+import os
+import sys
+import random
+import timeit
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "luffy.settings")
+django.setup()
+
+from utils.pricing import best_discount  # noqa
+
+NUMBER = 1000
+COUPON_TYPES = ("立减券", "满减券", "折扣券")
+
+
+def random_coupon():
+    return {
+        "coupon_type": random.choice(COUPON_TYPES),
+        "money_equivalent_value": random.randint(1, 200),
+        "minimum_consume": random.choice((0, 100, 500, 1000)),
+        "off_percent": random.randint(50, 95),
+    }
+
+
+def make_basket(item_num, course_coupon_num, gengeal_coupon_num):
+    items = [(course_id, float(random.randint(100, 10000))) for course_id in range(1, item_num + 1)]
+    course_coupons = {}
+    for record_id in range(course_coupon_num):
+        course_id = random.randint(1, item_num)
+        course_coupons.setdefault(course_id, {})[record_id] = random_coupon()
+    gengeal_coupons = {course_coupon_num + index: random_coupon() for index in range(gengeal_coupon_num)}
+    return items, course_coupons, gengeal_coupons
+
+
+def main():
+    random.seed(0)
+    for item_num, course_coupon_num, gengeal_coupon_num in ((5, 8, 2), (50, 80, 20), (200, 400, 100)):
+        basket = make_basket(item_num, course_coupon_num, gengeal_coupon_num)
+        cost = timeit.timeit(lambda: best_discount(*basket), number=NUMBER) / NUMBER * 1000
+        print("{:>4} 门课程 {:>4} 张优惠券: {:.3f} ms".format(
+            item_num, course_coupon_num + gengeal_coupon_num, cost))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+json渲染以及gzip压缩: 课程列表, 购物车, 结算中心响应的渲染耗时和传输字节数
+    python benchmarks/render_benchmark.py
+对比 DRF 的 JSONRenderer(标准库) 和 utils.renderers.FastJSONRenderer 可以使用的每个库
+"""
+import os
+import sys
+import random
+import timeit
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "luffy.settings")
+django.setup()
+
+from django.conf import settings  # noqa
+from django.utils.text import compress_string  # noqa
+from rest_framework.renderers import JSONRenderer  # noqa
+
+from utils import renderers  # noqa
+
+NUMBER = 200
+LEVELS = ("初级", "中级", "高级")
+
+
+def price_dict():
+    return {str(policy_id): {"price": float(random.randint(100, 10000)), "valid_period": period,
+                             "valid_period_id": "{}天".format(period)}
+            for policy_id, period in zip(random.sample(range(1, 1000), 3), (30, 60, 90))}
+
+
+def catalog(rows):
+    """同 Course.get 的分页响应"""
+    return {"results": [{"id": course_id, "title": "Python全栈开发课程{}".format(course_id),
+                         "course_img": "img/{}.png".format(course_id), "category": random.randint(1, 10),
+                         "level": random.choice(LEVELS), "study_num": random.randint(0, 10000),
+                         "price_policy": float(random.randint(100, 10000)),
+                         "brief": "从零开始学习python, django, restful接口开发" * 3}
+                        for course_id in range(1, rows + 1)], "next": "WyIxMiIsICIzNCJd"}
+
+
+def shopping_car(items):
+    """同 ShoppingCarView.get"""
+    return {"code": 1031, "error": None, "msg": "获取购物车成功",
+            "data": [{"price_dict": price_dict(), "course_name": "Python全栈开发课程{}".format(course_id),
+                      "default_price_policy_id": str(random.randint(1, 1000))} for course_id in range(items)]}
+
+
+def coupon(record_id):
+    return {"id": record_id, "coupon_type": random.choice(("立减券", "满减券", "折扣券")),
+            "money_equivalent_value": random.randint(1, 200), "minimum_consume": 100, "off_percent": 80,
+            "valid_begin_date": "2026-01-01", "valid_end_date": "2026-12-31", "name": "双十一优惠券"}
+
+
+def account(items):
+    """同 AccountBalanceView.get"""
+    detail_info = [{"course_info": {"course_id": course_id, "course_title": "Python全栈开发课程{}".format(course_id),
+                                    "price_dict": price_dict(), "default_price_policy_id": 1,
+                                    "price_version": 3, "price_changed": False},
+                    "course_coupon_info": {record_id: coupon(record_id) for record_id in range(course_id * 3)}}
+                   for course_id in range(1, items + 1)]
+    return {"code": 1000, "error": None, "data": {
+        "detail_info": detail_info,
+        "gengeal_info": {record_id: coupon(record_id) for record_id in range(1000, 1005)},
+        "price_info": {"original_total": 12345.0, "total": 10000.0, "discount": 2345.0, "gengeal_coupon_id": 1001,
+                       "items": [{"course_id": course_id, "price": 1000.0, "coupon_id": None}
+                                 for course_id in range(1, items + 1)]},
+    }}
+
+
+def fast_renderers():
+    result = []
+    for backend in ("orjson", "ujson"):
+        if getattr(renderers, backend) is None:
+            continue
+        settings.JSON_RENDERER_BACKEND = backend
+        result.append((backend, renderers.FastJSONRenderer()))
+    return result
+
+
+def main():
+    random.seed(0)
+    payloads = (
+        ("课程列表 20 条", catalog(20)),
+        ("课程列表 100 条", catalog(100)),
+        ("课程导出 10000 条", catalog(10000)),
+        ("购物车 20 门课程", shopping_car(20)),
+        ("结算中心 10 门课程", account(10)),
+    )
+    candidates = [("json", JSONRenderer())] + fast_renderers()
+    print("gzip 阈值 {} 字节".format(settings.GZIP_MIN_LENGTH))
+    for name, data in payloads:
+        print(name)
+        for backend, renderer in candidates:
+            content = renderer.render(data)
+            # 大的响应少执行几次
+            number = NUMBER if len(content) < 1024 * 1024 else 5
+            cost = timeit.timeit(lambda: renderer.render(data), number=number) / number * 1000
+            wire = len(compress_string(content)) if len(content) >= settings.GZIP_MIN_LENGTH else len(content)
+            print("    {:<7} {:>9.3f} ms  {:>9} 字节, 传输 {:>8} 字节".format(backend, cost, len(content), wire))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+列表接口 ModelSerializer 和只读快速序列化(utils.fast_serializer)的耗时对比, 每 10000 行
+    python benchmarks/serializer_benchmark.py
+只比较序列化, 不查询数据库: ModelSerializer 使用内存中的模型对象(价格策略放在 prefetch 缓存中),
+快速序列化使用同样数据的 values() 字典
+"""
+import os
+import sys
+import random
+import timeit
+import datetime
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "luffy.settings")
+django.setup()
+
+from django.utils import timezone  # noqa
+from django.contrib.contenttypes.models import ContentType  # noqa
+from rest_framework.renderers import JSONRenderer  # noqa
+
+from course import models  # noqa
+from course import serializers  # noqa
+
+ROWS = 10000
+NUMBER = 5
+
+
+class BenchCourseFastSerializer(serializers.CourseFastSerializer):
+    """价格策略不查询数据库"""
+
+    def prepare(self, rows):
+        self.prices = PRICES
+
+
+PRICES = {}
+
+
+def make_data():
+    # GenericRelation 的管理器需要 ContentType, 放到缓存中避免查询数据库
+    content_type = ContentType(id=1, app_label="course", model="course")
+    ContentType.objects._add_to_cache("default", content_type)
+
+    now = timezone.now()
+    courses, course_rows = [], []
+    comments, comment_rows = [], []
+    for course_id in range(1, ROWS + 1):
+        price = float(random.randint(100, 10000))
+        course = models.Course(id=course_id, title="课程{}".format(course_id), course_img="img/{}.png".format(course_id),
+                               category_id=random.randint(1, 10), level=random.choice((0, 1, 3)),
+                               study_num=random.randint(0, 10000), brief="简介" * 20, order=course_id)
+        course._prefetched_objects_cache = {"price_policy": [models.PricePolicy(price=price)]}
+        courses.append(course)
+        PRICES[course_id] = price
+        course_rows.append({"id": course_id, "title": course.title, "course_img": course.course_img.name,
+                            "category_id": course.category_id, "level": course.level,
+                            "study_num": course.study_num, "brief": course.brief, "order": course.order})
+
+        date = now - datetime.timedelta(seconds=course_id, microseconds=random.randint(0, 999999))
+        account = models.Account(id=course_id, username="user{}".format(course_id))
+        comments.append(models.Comment(id=course_id, account=account, content="评论内容" * 10, date=date))
+        comment_rows.append({"id": course_id, "account__username": account.username,
+                             "content": "评论内容" * 10, "date": date})
+    return courses, course_rows, comments, comment_rows
+
+
+def bench(name, slow, fast):
+    render = JSONRenderer().render
+    assert render(slow()) == render(fast()), name
+    slow_cost = timeit.timeit(slow, number=NUMBER) / NUMBER * 1000
+    fast_cost = timeit.timeit(fast, number=NUMBER) / NUMBER * 1000
+    print("{:<8} ModelSerializer {:>8.1f} ms, 快速序列化 {:>7.1f} ms, {:.1f} 倍".format(
+        name, slow_cost, fast_cost, slow_cost / fast_cost))
+
+
+def main():
+    random.seed(0)
+    courses, course_rows, comments, comment_rows = make_data()
+    categories = [models.Category(id=index, title="分类{}".format(index)) for index in range(ROWS)]
+    category_rows = [{"id": category.id, "title": category.title} for category in categories]
+
+    print("每 {} 行:".format(ROWS))
+    bench("分类", lambda: serializers.CourseCategorySerializer(categories, many=True).data,
+          lambda: serializers.CourseCategoryFastSerializer(category_rows, many=True).data)
+    bench("课程", lambda: serializers.CourseSerializer(courses, many=True).data,
+          lambda: BenchCourseFastSerializer(course_rows, many=True).data)
+    bench("评论", lambda: serializers.CourseCommentSerializer(comments, many=True).data,
+          lambda: serializers.CourseCommentFastSerializer(comment_rows, many=True).data)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CourseConfig(AppConfig):
     name = 'course'
+
+    def ready(self):
+        # 注册信号
+        from course import signals  # noqa
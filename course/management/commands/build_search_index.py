@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+
+from utils import search
+
+
+class Command(BaseCommand):
+    """从数据库重建课程搜索索引并保存快照, 进程启动时加载快照"""
+    help = "重建课程搜索索引的快照"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default=None, help="快照文件, 默认 settings.SEARCH_SNAPSHOT_PATH")
+
+    def handle(self, *args, **options):
+        index = search.SearchIndex()
+        index.rebuild(get_redis_connection("default"))
+        path = options["path"] or settings.SEARCH_SNAPSHOT_PATH
+        index.save(path)
+        self.stdout.write("索引 {} 门课程, {} 个词, 保存到 {}".format(len(index.docs), len(index.postings), path))
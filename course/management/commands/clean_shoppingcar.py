@@ -0,0 +1,107 @@
+import json
+import base64
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+from redis.exceptions import ResponseError
+
+# (匹配的key, 过期时间)
+PATTERNS = (
+    ("shoppingcar_*", "SHOPPINGCAR_TTL"),
+    ("accountcoupon_*", "ACCOUNT_TTL"),
+    ("gengeal_*", "ACCOUNT_TTL"),
+)
+
+
+class Command(BaseCommand):
+    """
+    清理长时间没有访问的购物车以及结算数据
+    空闲时间超过过期时间的key删除(可以先归档), 没有过期时间的旧key补上过期时间
+    """
+    help = "分批扫描并清理长时间没有访问的购物车以及结算数据"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=500, help="每批scan的key数量")
+        parser.add_argument("--idle", type=int, default=None,
+                            help="空闲超过多少秒的key被清理, 默认使用各自的过期时间")
+        parser.add_argument("--archive", default=None, help="删除之前把key dump到这个文件中(json lines)")
+        parser.add_argument("--dry-run", action="store_true", help="只统计, 不删除")
+
+    def handle(self, *args, **options):
+        self.r = get_redis_connection("default")
+        self.options = options
+        self.archive = open(options["archive"], "a") if options["archive"] else None
+        self.stats = {"scanned": 0, "evicted": 0, "expired": 0, "bytes": 0}
+        try:
+            for pattern, ttl_setting in PATTERNS:
+                ttl = getattr(settings, ttl_setting)
+                idle = options["idle"] if options["idle"] is not None else ttl
+                batch = []
+                for key in self.r.scan_iter(pattern, count=options["batch"]):
+                    batch.append(key)
+                    if len(batch) >= options["batch"]:
+                        self.clean_batch(batch, ttl, idle)
+                        batch = []
+                if batch:
+                    self.clean_batch(batch, ttl, idle)
+        finally:
+            if self.archive:
+                self.archive.close()
+
+        self.stdout.write("扫描 {scanned} 个key, 清理 {evicted} 个, 回收 {bytes} 字节, "
+                          "补充过期时间 {expired} 个".format(**self.stats))
+
+    def clean_batch(self, keys, ttl, idle):
+        self.stats["scanned"] += len(keys)
+        pipe = self.r.pipeline(transaction=False)
+        for key in keys:
+            pipe.execute_command("OBJECT", "IDLETIME", key)
+            pipe.ttl(key)
+            pipe.execute_command("MEMORY", "USAGE", key)
+        values = pipe.execute(raise_on_error=False)
+
+        stale = []
+        no_ttl = []
+        for index, key in enumerate(keys):
+            idle_time, key_ttl, size = values[index * 3: index * 3 + 3]
+            # maxmemory-policy 为 lfu 时没有 idletime
+            if not isinstance(idle_time, ResponseError) and idle_time is not None and idle_time >= idle:
+                stale.append((key, size if isinstance(size, int) else 0))
+            elif key_ttl == -1:
+                no_ttl.append(key)
+
+        if self.options["dry_run"]:
+            self.stats["evicted"] += len(stale)
+            self.stats["expired"] += len(no_ttl)
+            self.stats["bytes"] += sum(size for _, size in stale)
+            return
+
+        if self.archive and stale:
+            self.archive_keys([key for key, _ in stale])
+
+        pipe = self.r.pipeline(transaction=False)
+        for key, _ in stale:
+            pipe.delete(key)
+        for key in no_ttl:
+            pipe.expire(key, ttl)
+        results = pipe.execute()
+        # 扫描期间已经过期的key不计入
+        for (key, size), deleted in zip(stale, results):
+            if deleted:
+                self.stats["evicted"] += 1
+                self.stats["bytes"] += size
+        self.stats["expired"] += sum(1 for ret in results[len(stale):] if ret)
+
+    def archive_keys(self, keys):
+        pipe = self.r.pipeline(transaction=False)
+        for key in keys:
+            pipe.dump(key)
+        for key, dumped in zip(keys, pipe.execute()):
+            if dumped is None:
+                continue
+            # dump 的结果可以直接用 restore 恢复
+            self.archive.write(json.dumps({
+                "key": key.decode("utf-8"),
+                "dump": base64.b64encode(dumped).decode("ascii"),
+            }) + "\n")
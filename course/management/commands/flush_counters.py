@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+
+from utils import counter
+
+
+class Command(BaseCommand):
+    """把redis中缓冲的计数增量批量写入数据库"""
+    help = "批量写入计数器"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=500, help="每条UPDATE写入的对象数量")
+        parser.add_argument("--interval", type=float, default=0, help="大于0时每隔多少秒写入一次, 一直运行")
+
+    def handle(self, *args, **options):
+        r = get_redis_connection("default")
+        while True:
+            for buffered in counter.COUNTERS:
+                object_ids = buffered.flush(r, options["batch"])
+                if object_ids:
+                    self.stdout.write("{}: 写入 {} 个对象".format(buffered.key, len(object_ids)))
+            if options["interval"] <= 0:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+
+from utils import coupon_claim
+
+
+class Command(BaseCommand):
+    """把redis队列中的优惠券领取记录批量写入数据库"""
+    help = "批量写入优惠券领取记录"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=1000, help="每批写入的数量")
+        parser.add_argument("--interval", type=float, default=0, help="大于0时每隔多少秒写入一次, 一直运行")
+
+    def handle(self, *args, **options):
+        r = get_redis_connection("default")
+        while True:
+            count = coupon_claim.flush_claims(r, options["batch"])
+            if count:
+                self.stdout.write("写入 {} 条领取记录".format(count))
+            if options["interval"] <= 0:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,75 @@
+import json
+
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+
+from utils.shopping_car import ShoppingCar
+from utils.shopping_car import AccountCoupon
+
+
+class Command(BaseCommand):
+    """
+    把旧的 shoppingcar_<user_id>_<course_id> / accountcoupon_<user_id>_<course_id>
+    迁移到每个用户一个hash的新结构
+    """
+    help = "迁移购物车以及结算数据到每个用户一个hash的结构"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=500, help="每批scan的key数量")
+        parser.add_argument("--keep", action="store_true", help="迁移后保留旧的key")
+
+    def handle(self, *args, **options):
+        self.r = get_redis_connection("default")
+        car_num = self.migrate("shoppingcar_*_*", ShoppingCar, self.trans_car, options)
+        account_num = self.migrate("accountcoupon_*_*", AccountCoupon, self.trans_account, options)
+        self.stdout.write("迁移购物车 {} 条, 结算 {} 条".format(car_num, account_num))
+
+    def trans_car(self, data):
+        return {
+            "course_id": data[b"course_id"].decode("utf-8"),
+            "course_title": data[b"course_title"].decode("utf-8"),
+            "default_price_policy_id": data[b"default_price_policy_id"].decode("utf-8"),
+            "price_dict": json.loads(data[b"price_dict"].decode("utf-8")),
+        }
+
+    def trans_account(self, data):
+        return {
+            "course_info": json.loads(data[b"course_info"].decode("utf-8")),
+            "course_coupon_info": json.loads(data[b"course_coupon_info"].decode("utf-8")),
+        }
+
+    def migrate(self, pattern, store_class, trans, options):
+        count = 0
+        batch = []
+        for key in self.r.scan_iter(pattern, count=options["batch"]):
+            batch.append(key)
+            if len(batch) >= options["batch"]:
+                count += self.migrate_batch(batch, store_class, trans, options)
+                batch = []
+        if batch:
+            count += self.migrate_batch(batch, store_class, trans, options)
+        return count
+
+    def migrate_batch(self, keys, store_class, trans, options):
+        # 一次管道取出这一批旧数据
+        pipe = self.r.pipeline(transaction=False)
+        for key in keys:
+            pipe.hgetall(key)
+        values = pipe.execute()
+
+        # 按用户分组, 每个用户一次hmset
+        grouped = {}
+        for key, data in zip(keys, values):
+            if not data:
+                continue
+            _, user_id, course_id = key.decode("utf-8").rsplit("_", 2)
+            grouped.setdefault(user_id, {})[course_id] = trans(data)
+
+        pipe = self.r.pipeline(transaction=False)
+        for user_id, mapping in grouped.items():
+            store = store_class(pipe, user_id)
+            store.set_many(mapping)
+        if not options["keep"]:
+            pipe.delete(*keys)
+        pipe.execute()
+        return sum(len(mapping) for mapping in grouped.values())
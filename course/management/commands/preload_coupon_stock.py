@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+
+from utils import coupon_claim
+
+
+class Command(BaseCommand):
+    """秒杀活动开始之前把优惠券的剩余数量预热到redis中"""
+    help = "预热优惠券的剩余数量以及已经领取的用户"
+
+    def add_arguments(self, parser):
+        parser.add_argument("coupon_id", nargs="*", type=int, help="默认预热所有领取时间没有结束的优惠券")
+
+    def handle(self, *args, **options):
+        stocks = coupon_claim.preload_all(get_redis_connection("default"), options["coupon_id"])
+        for coupon_id, stock in stocks.items():
+            self.stdout.write("优惠券 {} 剩余 {} 张".format(coupon_id, stock))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+
+from course.models import Course
+from utils import course_doc
+
+
+class Command(BaseCommand):
+    """重建被修改过的课程详细页面文档"""
+    help = "重建课程详细页面文档"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=100, help="每批重建的课程数量")
+        parser.add_argument("--interval", type=float, default=0, help="大于0时每隔多少秒检查一次, 一直运行")
+        parser.add_argument("--all", action="store_true", help="重建所有课程")
+
+    def handle(self, *args, **options):
+        r = get_redis_connection("default")
+        if options["all"]:
+            course_ids = list(Course.objects.values_list("id", flat=True))
+            for start in range(0, len(course_ids), options["batch"]):
+                course_doc.build_docs(r, course_ids[start: start + options["batch"]])
+            self.stdout.write("重建 {} 门课程".format(len(course_ids)))
+            return
+        while True:
+            count = course_doc.rebuild_dirty(r, options["batch"])
+            if count:
+                self.stdout.write("重建 {} 门课程".format(count))
+            # 一批没有处理完, 继续处理
+            if count >= options["batch"]:
+                continue
+            if options["interval"] <= 0:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+
+from course.models import Token
+from utils import token_bloom
+
+
+class Command(BaseCommand):
+    """定期从 Token 表重建有效token的布隆过滤器, 并输出拒绝率和误判率"""
+    help = "重建有效token的布隆过滤器"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=1000, help="每批写入redis的token数量")
+        parser.add_argument("--stats", action="store_true", help="只输出统计, 不重建")
+
+    def handle(self, *args, **options):
+        r = get_redis_connection("default")
+        if not options["stats"]:
+            digests = Token.objects.filter(expire_time__gt=int(time.time())).values_list(
+                "digest", flat=True).iterator()
+            count = token_bloom.rebuild(r, digests, options["batch"])
+            self.stdout.write("重建布隆过滤器, 加入 {} 个token".format(count))
+        self.stdout.write("查询 {checked} 次, 拒绝 {rejected} 次, 误判 {false_positive} 次, "
+                          "拒绝率 {reject_rate:.2%}, 误判率 {false_positive_rate:.2%}".format(**token_bloom.get_stats(r)))
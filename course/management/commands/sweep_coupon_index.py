@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django_redis import get_redis_connection
+
+from utils import coupon
+
+
+class Command(BaseCommand):
+    """定期清理用户优惠券索引中有效期已经结束的优惠券"""
+    help = "清理用户优惠券索引中已经过期的优惠券"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=500, help="每批scan的key数量")
+
+    def handle(self, *args, **options):
+        r = get_redis_connection("default")
+        users = 0
+        removed = 0
+        for key in r.scan_iter(coupon.INDEX_KEY.format("*"), count=options["batch"]):
+            user_id = key.decode("utf-8").rsplit("_", 1)[1]
+            removed += coupon.sweep_index(r, user_id)
+            users += 1
+        self.stdout.write("扫描 {} 个用户, 清理 {} 张过期优惠券".format(users, removed))
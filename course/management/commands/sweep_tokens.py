@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from course.models import Token
+
+
+class Command(BaseCommand):
+    """定期删除已经过期的token, 每批按主键删除, 不会长时间锁表"""
+    help = "分批删除已经过期的token"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=1000, help="每批删除的数量")
+        parser.add_argument("--sleep", type=float, default=0, help="每批之间休眠的秒数")
+
+    def handle(self, *args, **options):
+        now = int(time.time())
+        deleted = 0
+        while True:
+            # expire_time 上有索引
+            ids = list(Token.objects.filter(expire_time__lte=now).values_list("id", flat=True)[:options["batch"]])
+            if not ids:
+                break
+            deleted += Token.objects.filter(id__in=ids).delete()[0]
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+        self.stdout.write("删除 {} 个过期token".format(deleted))
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import hashlib
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def forwards(apps, schema_editor):
+    """已经签发的token转换为摘要, 过期时间 = 创建时间 + 有效期"""
+    Token = apps.get_model("course", "Token")
+    for token_obj in Token.objects.all().iterator():
+        try:
+            create_time = int(float(token_obj.create_time))
+        except (TypeError, ValueError):
+            create_time = 0
+        token_obj.digest = hashlib.sha256(token_obj.token.encode("utf-8")).hexdigest()
+        token_obj.expire_time = create_time + settings.TOKEN_EXPIRE
+        token_obj.save(update_fields=["digest", "expire_time"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0007_coupon_couponrecord'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='token',
+            name='digest',
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='token',
+            name='expire_time',
+            field=models.IntegerField(db_index=True, default=0),
+            preserve_default=False,
+        ),
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='token',
+            name='create_time',
+        ),
+        migrations.RemoveField(
+            model_name='token',
+            name='token',
+        ),
+        migrations.AlterField(
+            model_name='token',
+            name='digest',
+            field=models.CharField(max_length=64, unique=True),
+        ),
+    ]
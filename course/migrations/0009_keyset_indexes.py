@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('course', '0008_token_digest'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['order', 'id'], name='course_order_id'),
+        ),
+        migrations.AddIndex(
+            model_name='course',
+            index=models.Index(fields=['category', 'order', 'id'], name='course_category_order_id'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['date', 'id'], name='comment_date_id'),
+        ),
+    ]
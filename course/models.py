@@ -58,6 +58,11 @@ class Course(models.Model):
     class Meta:
         verbose_name_plural = verbose_name = "02-课程表"
         db_table = "02-课程表"
+        # 课程列表的游标分页
+        indexes = [
+            models.Index(fields=["order", "id"], name="course_order_id"),
+            models.Index(fields=["category", "order", "id"], name="course_category_order_id"),
+        ]
 
 
 class CourseDetail(models.Model):
@@ -210,6 +215,10 @@ class Comment(models.Model):
     class Meta:
         verbose_name_plural = verbose_name = "10-评论表"
         db_table = "10-通用评论表"
+        # 评论列表的游标分页
+        indexes = [
+            models.Index(fields=["date", "id"], name="comment_date_id"),
+        ]
 
 
 class Account(models.Model):
@@ -228,9 +237,10 @@ class Account(models.Model):
 class Token(models.Model):
     """和账户关联的token值"""
     user = models.OneToOneField(to="Account")
-    token = models.CharField(max_length=128)
-    # create_time = models.DateTimeField(auto_now_add=True)
-    create_time = models.CharField(max_length=128)
+    # 不保存token原文, 只保存 sha256 摘要, 认证时按摘要查询
+    digest = models.CharField(max_length=64, unique=True)
+    # 过期的时间戳(秒), 定期由 sweep_tokens 命令删除
+    expire_time = models.IntegerField(db_index=True)
 
 
 class CourseOutline(models.Model):
@@ -0,0 +1,11 @@
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+
+
+class GZipThresholdMiddleware(GZipMiddleware):
+    """响应大于 GZIP_MIN_LENGTH 字节时压缩, 小的响应压缩之后节省不多, 不浪费cpu; 流式响应全部压缩"""
+
+    def process_response(self, request, response):
+        if not response.streaming and len(response.content) < settings.GZIP_MIN_LENGTH:
+            return response
+        return super(GZipThresholdMiddleware, self).process_response(request, response)
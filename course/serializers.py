@@ -1,8 +1,13 @@
 import hashlib
 
+from django.contrib.contenttypes.models import ContentType
+from django.core.files.storage import default_storage
 from rest_framework import serializers
+from rest_framework.settings import api_settings
+from rest_framework import ISO_8601
 
 from . import models
+from utils.fast_serializer import FastSerializer
 
 
 class CourseCategorySerializer(serializers.ModelSerializer):
@@ -40,7 +45,8 @@ class CourseDetailSerializer(serializers.ModelSerializer):
                  "price": price_obj.price} for price_obj in obj.course.price_policy.all()]
 
     def get_course_outline(self, obj):
-        outlines = obj.course_outline.all().order_by("order")
+        # 在内存中排序, 可以使用 prefetch_related 的结果
+        outlines = sorted(obj.course_outline.all(), key=lambda outline: outline.order)
         return [{"title": outline.title, "content": outline.content} for outline in outlines]
 
     def get_recommend_courses(self, obj):
@@ -62,7 +68,8 @@ class CourseChapterSerializer(serializers.ModelSerializer):
 
     def get_sections(self, obj):
         sections = obj.course_sections.all().order_by("section_order")
-        return [{"id": item.id, "title": item.title} for item in sections]
+        return [{"id": item.id, "title": item.title, "free_trail": item.free_trail, "section_type": item.section_type}
+                for item in sections]
 
     class Meta:
         model = models.CourseChapter
@@ -88,3 +95,76 @@ class UserSerializer(serializers.ModelSerializer):
         md5_str = hashlib.md5(password_salt.encode()).hexdigest()
         user_obj = models.Account.objects.create(username=validated_data["username"], password=md5_str)
         return user_obj
+
+
+# 以下为列表接口使用的只读快速序列化, 输出和上面对应的 ModelSerializer 相同, 见 utils.fast_serializer
+
+class CourseCategoryFastSerializer(FastSerializer):
+    """同 CourseCategorySerializer"""
+    fields = (
+        ("id", "id", None),
+        ("title", "title", None),
+    )
+
+
+LEVEL_DISPLAY = dict(models.Course.LEVEL_CHOICES)
+_datetime_field = serializers.DateTimeField()
+
+
+class CourseFastSerializer(FastSerializer):
+    """同 CourseSerializer, 价格策略一次查询"""
+    fields = (
+        ("id", "id", None),
+        ("title", "title", None),
+        ("course_img", "course_img", "get_course_img"),
+        ("category", "category_id", None),
+        ("level", "level", "get_level"),
+        ("study_num", "study_num", None),
+        ("price_policy", "id", "get_price_policy"),
+        ("brief", "brief", None),
+    )
+
+    def prepare(self, rows):
+        # 每门课程的第一个价格策略, 和 obj.price_policy.all() 的顺序相同
+        self.prices = {}
+        course_ids = [row["id"] for row in rows]
+        if not course_ids:
+            return
+        price_queryset = models.PricePolicy.objects.filter(
+            content_type=ContentType.objects.get_for_model(models.Course),
+            object_id__in=course_ids).values_list("object_id", "price")
+        for object_id, price in price_queryset:
+            self.prices.setdefault(object_id, price)
+
+    def get_course_img(self, name):
+        return default_storage.url(name) if name else None
+
+    def get_level(self, level):
+        return str(LEVEL_DISPLAY.get(level, level))
+
+    def get_price_policy(self, course_id):
+        return self.prices.get(course_id)
+
+
+class CourseCommentFastSerializer(FastSerializer):
+    """同 CourseCommentSerializer"""
+    fields = (
+        ("id", "id", None),
+        ("account", "account__username", str),
+        ("content", "content", str),
+        ("date", "date", "get_date"),
+    )
+
+    def prepare(self, rows):
+        # 时区和输出格式只取一次
+        self.timezone = _datetime_field.default_timezone()
+        self.iso_format = (api_settings.DATETIME_FORMAT or "").lower() == ISO_8601
+
+    def get_date(self, value):
+        """同 serializers.DateTimeField().to_representation, 数据库中读出的带时区的时间直接转换"""
+        if not value or self.timezone is None or value.tzinfo is None or not self.iso_format:
+            return _datetime_field.to_representation(value)
+        value = value.astimezone(self.timezone).isoformat()
+        if value.endswith("+00:00"):
+            value = value[:-6] + "Z"
+        return value
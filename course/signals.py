@@ -0,0 +1,155 @@
+from django.db import transaction
+from django.db.models.signals import post_save
+from django.db.models.signals import post_delete
+from django.db.models.signals import pre_delete
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+from django.contrib.contenttypes.models import ContentType
+from django_redis import get_redis_connection
+
+from course.models import Course
+from course.models import Category
+from course.models import CourseDetail
+from course.models import CourseOutline
+from course.models import Teacher
+from course.models import CourseChapter
+from course.models import CourseSection
+from course.models import Coupon
+from course.models import CouponRecord
+from course.models import PricePolicy
+from utils import coupon
+from utils import course_doc
+from utils import search
+from utils import price_policy
+from utils import versions
+
+
+def on_commit(func, *args):
+    """
+    事务提交之后再修改redis: admin 在事务中保存, 提交之前其他请求会用旧数据重新生成快照/缓存, 并带上新的版本号
+    参数在调用时取值, 删除之后 instance.id 会被置为 None
+    """
+    transaction.on_commit(lambda: func(get_redis_connection("default"), *args))
+
+
+@receiver([post_save, post_delete], sender=PricePolicy)
+def invalidate_price_policy(sender, instance, **kwargs):
+    """价格策略修改, 删除课程的价格策略快照"""
+    if instance.content_type_id == ContentType.objects.get_for_model(Course).id:
+        on_commit(price_policy.invalidate, instance.object_id)
+
+
+@receiver([post_save, post_delete], sender=Course)
+def invalidate_course_price_policy(sender, instance, **kwargs):
+    """课程名称修改或者课程删除, 快照中保存了课程名称"""
+    on_commit(price_policy.invalidate, instance.id)
+
+
+@receiver([post_save, post_delete], sender=Course)
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_catalog(sender, instance, **kwargs):
+    """课程列表中有课程信息以及分类"""
+    on_commit(versions.bump, versions.CATALOG)
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category(sender, instance, **kwargs):
+    on_commit(versions.bump, versions.CATEGORY)
+
+
+@receiver([post_save, post_delete], sender=PricePolicy)
+def invalidate_catalog_price(sender, instance, **kwargs):
+    """课程列表中有课程的价格"""
+    if instance.content_type_id == ContentType.objects.get_for_model(Course).id:
+        on_commit(versions.bump, versions.CATALOG)
+
+
+@receiver(post_save, sender=CouponRecord)
+def update_coupon_index(sender, instance, **kwargs):
+    """领取, 使用优惠券, 更新用户的优惠券索引"""
+    on_commit(coupon.update_index, instance)
+
+
+@receiver(post_delete, sender=CouponRecord)
+def remove_coupon_index(sender, instance, **kwargs):
+    on_commit(coupon.remove_from_index, instance.user_id, instance.id)
+
+
+@receiver(post_save, sender=Coupon)
+def update_coupon_records_index(sender, instance, **kwargs):
+    """
+    优惠券规则修改(有效期, 面额等), 删除所有领取了这个优惠券的用户的索引, 下次读取时重新生成
+    一个活动可能有上千条领取记录, 不逐条更新
+    """
+    user_ids = list(instance.couponrecord_set.values_list("user_id", flat=True).distinct())
+    on_commit(coupon.invalidate_index, user_ids)
+
+
+@receiver([post_save, pre_delete], sender=Course)
+def mark_course_doc(sender, instance, **kwargs):
+    """课程修改, 重建这门课程以及推荐了这门课程的课程的详细页面; 删除之前推荐关系还在"""
+    course_ids = [instance.id]
+    course_ids.extend(instance.recommend_by.values_list("course_id", flat=True))
+    course_doc.mark_dirty(get_redis_connection("default"), course_ids)
+
+
+@receiver([post_save, post_delete], sender=CourseDetail)
+def mark_course_detail_doc(sender, instance, **kwargs):
+    course_doc.mark_dirty(get_redis_connection("default"), [instance.course_id])
+
+
+@receiver([post_save, post_delete], sender=CourseOutline)
+def mark_course_outline_doc(sender, instance, **kwargs):
+    course_ids = CourseDetail.objects.filter(id=instance.course_detail_id).values_list("course_id", flat=True)
+    course_doc.mark_dirty(get_redis_connection("default"), list(course_ids))
+
+
+@receiver([post_save, post_delete], sender=PricePolicy)
+def mark_price_policy_doc(sender, instance, **kwargs):
+    if instance.content_type_id == ContentType.objects.get_for_model(Course).id:
+        course_doc.mark_dirty(get_redis_connection("default"), [instance.object_id])
+
+
+@receiver(post_save, sender=Teacher)
+def mark_teacher_doc(sender, instance, **kwargs):
+    """讲师修改, 重建所有有这个讲师的课程; 删除讲师时先触发 m2m 的清除"""
+    course_ids = CourseDetail.objects.filter(teachers=instance).values_list("course_id", flat=True)
+    course_doc.mark_dirty(get_redis_connection("default"), list(course_ids))
+
+
+@receiver(m2m_changed, sender=CourseDetail.teachers.through)
+@receiver(m2m_changed, sender=CourseDetail.recommend_courses.through)
+def mark_relation_doc(sender, instance, action, reverse, pk_set, **kwargs):
+    """课程详细的讲师以及推荐课程修改"""
+    if action not in ("post_add", "post_remove", "pre_clear"):
+        return
+    if not reverse:
+        course_ids = [instance.course_id]
+    elif action == "pre_clear":
+        # 从讲师或者课程一侧清除, 清除之前查出关联的课程详细
+        related = instance.coursedetail_set if sender is CourseDetail.teachers.through else instance.recommend_by
+        course_ids = list(related.values_list("course_id", flat=True))
+    else:
+        course_ids = list(CourseDetail.objects.filter(id__in=pk_set).values_list("course_id", flat=True))
+    course_doc.mark_dirty(get_redis_connection("default"), course_ids)
+
+
+@receiver([post_save, post_delete], sender=CourseChapter)
+def invalidate_chapter(sender, instance, **kwargs):
+    on_commit(versions.bump, versions.CHAPTER.format(instance.course_id))
+
+
+@receiver([post_save, post_delete], sender=CourseSection)
+def invalidate_section(sender, instance, **kwargs):
+    course_ids = CourseChapter.objects.filter(id=instance.chapter_id).values_list("course_id", flat=True)
+    on_commit(versions.bump, *[versions.CHAPTER.format(course_id) for course_id in course_ids])
+
+
+@receiver([post_save, post_delete], sender=Course)
+def update_course_search(sender, instance, **kwargs):
+    on_commit(search.mark_changed, [instance.id])
+
+
+@receiver([post_save, post_delete], sender=CourseDetail)
+def update_course_detail_search(sender, instance, **kwargs):
+    on_commit(search.mark_changed, [instance.course_id])
@@ -1,16 +1,23 @@
 from django.conf.urls import url
 
 from course.view.login import Login
+from course.view.login import Logout
 from course.view.course import Course
 from course.view.course import CourseChapter
 from course.view.course import CourseCategory
 from course.view.course import CourseDetailView
 from course.view.course import CourseContentView
+from course.view.course import CourseExportView
+from course.view.course import CourseCommentExportView
 from course.view.shopping import ShoppingCarView, AccountBalanceView
+from course.view.coupon import CouponClaimView
+from course.view.search import CourseSearchView
 
 urlpatterns = [
     # 登陆
     url(r"^login/$", Login.as_view()),
+    # 注销
+    url(r"^logout/$", Logout.as_view()),
 
     url(r"^$", Course.as_view()),
     url(r'^coursecategory/$', CourseCategory.as_view()),
@@ -18,9 +25,19 @@ urlpatterns = [
     url(r'^coursechapter/(?P<pk>\d+)/$', CourseChapter.as_view()),
     url(r'^coursecomment/$', CourseContentView.as_view()),
 
+    # 课程搜索
+    url(r'^search/$', CourseSearchView.as_view()),
+
+    # 导出全部数据, 流式返回
+    url(r'^export/$', CourseExportView.as_view()),
+    url(r'^coursecomment/export/$', CourseCommentExportView.as_view()),
+
     # 购物车使用认证
     url(r'shoppingcar/$', ShoppingCarView.as_view()),
 
     # 结算
-    url(r'account/$', AccountBalanceView.as_view())
+    url(r'account/$', AccountBalanceView.as_view()),
+
+    # 领取优惠券
+    url(r'^coupon/claim/$', CouponClaimView.as_view()),
 ]
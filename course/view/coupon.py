@@ -0,0 +1,47 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from django_redis import get_redis_connection
+
+from utils.base_response import BaseResponse
+from utils.authentications import UserAuthentication
+from utils import coupon_claim
+
+
+class CouponClaimView(APIView):
+    """
+    领取优惠券
+    1070 领取成功
+    1071 活动不存在或者没有开始
+    1072 已经领取过
+    1073 已经领完
+    """
+    authentication_classes = [UserAuthentication, ]
+
+    def __init__(self):
+        self.r = get_redis_connection("default")
+        super(CouponClaimView, self).__init__()
+
+    def post(self, request):
+        res = BaseResponse()
+        try:
+            coupon_id = int(request.data.get("coupon_id"))
+        except (TypeError, ValueError):
+            res.code = 1071
+            res.error = "优惠券不存在"
+            return Response(res.dict)
+
+        # 库存校验和扣减在redis中原子完成, 领取记录由 flush_coupon_claims 批量写入数据库
+        ret = coupon_claim.claim(self.r, coupon_id, request.user.id)
+        if ret == coupon_claim.CLAIM_OK:
+            res.code = 1070
+            res.msg = "领取成功"
+        elif ret == coupon_claim.CLAIM_ALREADY:
+            res.code = 1072
+            res.error = "已经领取过了"
+        elif ret == coupon_claim.CLAIM_SOLD_OUT:
+            res.code = 1073
+            res.error = "优惠券已经领完了"
+        else:
+            res.code = 1071
+            res.error = "活动不存在或者不在领取时间内"
+        return Response(res.dict)
@@ -1,76 +1,152 @@
 import uuid
 
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
 from course import models
-from course.serializers import CourseCategorySerializer
-from course.serializers import CourseSerializer
-from course.serializers import CourseDetailSerializer
-from course.serializers import CourseChapterSerializer
-from course.serializers import CourseCommentSerializer
+from course.serializers import CourseCategoryFastSerializer
+from course.serializers import CourseFastSerializer
+from course.serializers import CourseCommentFastSerializer
 from course.serializers import UserSerializer
 from course.models import Account
 # 导入BaseResponse
 from utils.base_response import BaseResponse
 # 认证
 from utils.authentications import UserAuthentication
+# 限流
+from utils.throttle import IPThrottle, UsernameThrottle, TokenThrottle
+from utils import versions
+from utils.conditional import version_condition
+from utils import course_doc
+from utils import course_chapter
+from utils import counter
+from utils.pagination import KeysetPagination, InvalidCursor
+from utils.streaming import streaming_response
+
+# 课程列表的缓存, 分类id, 课程列表的版本号, 每页数量, 游标
+CATALOG_CACHE_KEY = "catalog_{}_{}_{}_{}"
 
 
 class CourseCategory(APIView):
     """课程分类"""
 
+    @version_condition(lambda request: versions.CATEGORY)
     def get(self, request):
-        queryset = models.Category.objects.all()
-        ser_obj = CourseCategorySerializer(queryset, many=True)
+        queryset = models.Category.objects.values(*CourseCategoryFastSerializer.columns)
+        ser_obj = CourseCategoryFastSerializer(queryset, many=True)
         return Response(ser_obj.data)
 
 
 class Course(APIView):
-    """课程"""
+    """课程, 按 (order, id) 倒序游标分页"""
     # authentication_classes = [UserAuthentication, ]
+    pagination = KeysetPagination(("-order", "-id"))
 
+    # 学习人数合并了redis中的增量, 计数时 ETag 也要变化
+    @version_condition(lambda request: (versions.CATALOG, counter.study_num.resource))
     def get(self, request):
         cartegory_id = request.query_params.get("category", "0")
+        try:
+            page_size = self.pagination.get_page_size(request)
+        except InvalidCursor:
+            return Response({"code": 1080, "error": "分页参数错误"})
+        # 课程, 分类, 价格策略修改时版本号+1, 旧的缓存不再使用
+        cache_key = CATALOG_CACHE_KEY.format(
+            cartegory_id, versions.get_version(get_redis_connection("default"), versions.CATALOG),
+            page_size, request.query_params.get("cursor", ""))
+        data = cache.get(cache_key)
+        if data is not None:
+            return Response(self.merge_study_num(data))
+
         if cartegory_id == "0":
-            queryset = models.Course.objects.all().order_by("-order")
+            queryset = models.Course.objects.all()
         else:
-            queryset = models.Course.objects.filter(category_id=cartegory_id).order_by("-order")
+            queryset = models.Course.objects.filter(category_id=cartegory_id)
+        # 分页需要 order 字段, 价格策略在序列化时一次查询
+        queryset = queryset.values("order", *CourseFastSerializer.columns)
+        try:
+            rows, next_cursor = self.pagination.paginate(queryset, request)
+        except InvalidCursor:
+            return Response({"code": 1080, "error": "分页参数错误"})
 
-        ser_obj = CourseSerializer(queryset, many=True)
-        return Response(ser_obj.data)
+        data = {"results": CourseFastSerializer(rows, many=True).data, "next": next_cursor}
+        cache.set(cache_key, data, settings.CATALOG_CACHE_TTL)
+        return Response(self.merge_study_num(data))
+
+    def merge_study_num(self, data):
+        """缓存中是数据库的学习人数, 加上redis中还没有写入的增量"""
+        results = [dict(row) for row in data["results"]]
+        counter.study_num.merge(get_redis_connection("default"), results)
+        return {"results": results, "next": data["next"]}
+
+
+class CourseExportView(APIView):
+    """导出所有课程, 按id顺序流式返回json数组"""
+    # 导出整张表, 需要登录并且限制次数
+    authentication_classes = [UserAuthentication, ]
+    throttle_scope = "export"
+    throttle_classes = (IPThrottle, UsernameThrottle, TokenThrottle)
+
+    def get(self, request):
+        queryset = models.Course.objects.values(*CourseFastSerializer.columns)
+        return streaming_response(queryset, CourseFastSerializer)
 
 
 class CourseDetailView(APIView):
     """课程详细页面"""
 
+    @version_condition(lambda request, pk: (versions.COURSE_DOC.format(pk), counter.study_num.object_resource(pk)))
     def get(self, request, pk):
-        course_detail_obj = models.CourseDetail.objects.filter(course_id=pk).first()
-        if not course_detail_obj:
+        # 预生成的文档, 见 utils.course_doc
+        data = course_doc.get_doc(get_redis_connection("default"), pk)
+        if data is None:
             return Response({"code": 1001, "errors": "不存在这门课程"})
-        ser_obj = CourseDetailSerializer(course_detail_obj)
-        return Response(ser_obj.data)
+        data["study_num"] += counter.study_num.pending(get_redis_connection("default"), [pk]).get(int(pk), 0)
+        return Response(data)
 
 
 class CourseChapter(APIView):
     """课程章节"""
 
+    @version_condition(lambda request, pk: versions.CHAPTER.format(pk))
     def get(self, request, pk):
-        queryset = models.CourseChapter.objects.filter(course_id=pk)
-        ser_obj = CourseChapterSerializer(queryset, many=True)
-        return Response(ser_obj.data)
+        # 章节和课时一次查询, 见 utils.course_chapter
+        return Response(course_chapter.get_tree(get_redis_connection("default"), pk))
 
 
 class CourseContentView(APIView):
-    """课程评论"""
+    """课程评论, 按 (date, id) 倒序游标分页"""
+    pagination = KeysetPagination(("-date", "-id"))
 
     def get(self, request):
-        queryset = models.Comment.objects.all()
-        ser_obj = CourseCommentSerializer(queryset, many=True)
-        return Response(ser_obj.data)
+        queryset = models.Comment.objects.values(*CourseCommentFastSerializer.columns)
+        try:
+            rows, next_cursor = self.pagination.paginate(queryset, request)
+        except InvalidCursor:
+            return Response({"code": 1080, "error": "分页参数错误"})
+        ser_obj = CourseCommentFastSerializer(rows, many=True)
+        return Response({"results": ser_obj.data, "next": next_cursor})
+
+
+class CourseCommentExportView(APIView):
+    """导出所有评论, 按id顺序流式返回json数组"""
+    # 导出整张表, 需要登录并且限制次数
+    authentication_classes = [UserAuthentication, ]
+    throttle_scope = "export"
+    throttle_classes = (IPThrottle, UsernameThrottle, TokenThrottle)
+
+    def get(self, request):
+        queryset = models.Comment.objects.values(*CourseCommentFastSerializer.columns)
+        return streaming_response(queryset, CourseCommentFastSerializer)
 
 
 class UserView(APIView):
+    throttle_scope = "register"
+    throttle_username_field = "username"
+    throttle_classes = (IPThrottle, UsernameThrottle, TokenThrottle)
 
     # 注册用户
     def post(self, request):
@@ -1,15 +1,25 @@
 import time
 import hashlib
 
+from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
 
 from course.models import Account
-from course.models import Token
 from utils.base_response import BaseResponse
+from utils import token_cache
+from utils import signed_token
+from utils import token_store
+from utils.throttle import IPThrottle, UsernameThrottle, TokenThrottle
+from utils.authentications import UserAuthentication
 
 
 class Login(APIView):
+    # 按ip和用户名限流, 见 settings.THROTTLE_RATES
+    throttle_scope = "login"
+    throttle_username_field = "user"
+    throttle_classes = (IPThrottle, UsernameThrottle, TokenThrottle)
+
     def get_sercet_str(self, user):
         md5 = hashlib.md5()
         ret = user + str(time.time())
@@ -27,10 +37,19 @@ class Login(APIView):
                 res.code = 1003
                 res.error = "用户名密码错误"
                 return Response(res.dict)
+            if settings.TOKEN_AUTH_MODE == "signed":
+                # 签名token不保存, 直接返回
+                res.code = 1001
+                res.token = signed_token.make_token(user_obj.id)
+                res.data = {"name": username}
+                return Response(res.dict)
             # 获取随机字符串
             sercet_str = self.get_sercet_str(username)
             # 数据库中有这个用户就更新这个token， 没有就创建这个用户和token
-            Token.objects.update_or_create(user_id=user_obj.id, defaults={"token": sercet_str})
+            old_digest = token_store.issue(user_obj.id, sercet_str)
+            # 旧的token失效, 通知所有进程删除缓存
+            if old_digest:
+                token_cache.revoke(old_digest)
             res.code = 1001
             res.token = sercet_str
             res.data = {"name": username}
@@ -38,3 +57,19 @@ class Login(APIView):
             res.code = 2000
             res.err_msg = str(e)
         return Response(res.dict)
+
+
+class Logout(APIView):
+    """注销当前的token, 签名token加入吊销列表, 数据库token删除并通知所有进程删除缓存"""
+    authentication_classes = [UserAuthentication, ]
+
+    def post(self, request):
+        res = BaseResponse()
+        token = request.META.get("HTTP_TOKEN")
+        if settings.TOKEN_AUTH_MODE == "signed":
+            signed_token.revoke(token)
+        else:
+            digest = token_store.make_digest(token)
+            token_store.delete(digest)
+            token_cache.revoke(digest)
+        return Response(res.dict)
@@ -0,0 +1,20 @@
+from django.conf import settings
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from django_redis import get_redis_connection
+
+from utils import search
+
+
+class CourseSearchView(APIView):
+    """课程搜索, ?q=关键字&limit=20, 见 utils.search"""
+
+    def get(self, request):
+        query = request.query_params.get("q", "").strip()
+        try:
+            limit = max(1, min(int(request.query_params.get("limit", settings.PAGE_SIZE)), settings.MAX_PAGE_SIZE))
+        except ValueError:
+            limit = settings.PAGE_SIZE
+        if not query:
+            return Response({"results": []})
+        return Response({"results": search.search(get_redis_connection("default"), query, limit)})
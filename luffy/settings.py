@@ -39,6 +39,8 @@ INSTALLED_APPS = [
     'rest_framework',
 ]
 MIDDLEWARE = [
+    # 压缩要在最外层, 其他中间件修改完响应之后再压缩
+    'course.mymiddleware.gzipmiddleware.GZipThresholdMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -128,3 +130,58 @@ CACHES = {
         }
     }
 }
+
+# 购物车的过期时间(秒), 每次访问购物车时刷新
+SHOPPINGCAR_TTL = 3600 * 24 * 30
+# 结算中心(accountcoupon_*, gengeal_*)的过期时间(秒), 每次访问时刷新
+ACCOUNT_TTL = 3600 * 24
+# 用户可用优惠券索引的过期时间(秒), 每次结算时刷新
+COUPON_INDEX_TTL = 3600 * 24 * 7
+# 批量写入优惠券领取记录的锁的过期时间(秒), 每批写入完成后释放
+COUPON_FLUSH_LOCK_TIMEOUT = 60
+# 进程内token缓存的容量以及过期时间(秒), token失效时通过redis发布订阅通知所有进程
+TOKEN_LOCAL_CACHE_SIZE = 10000
+TOKEN_LOCAL_CACHE_TTL = 60
+# token的有效期(秒)
+TOKEN_EXPIRE = 3600 * 24 * 14
+# token认证方式: "db" 随机字符串保存在数据库中; "signed" 签名token, 只需要校验签名, 不需要查询数据库和redis
+TOKEN_AUTH_MODE = "db"
+# 有效token的布隆过滤器: 位数以及哈希函数个数, 2**25 位(4MB) 7 个哈希函数在 200 万个token时误判率约 1%
+TOKEN_BLOOM_BITS = 2 ** 25
+TOKEN_BLOOM_HASHES = 7
+# 接口限流(滑动窗口): {"<视图的throttle_scope>_<ip|username|token>": (窗口内最多请求次数, 窗口秒数)}, 没有配置的不限流
+THROTTLE_RATES = {
+    "login_ip": (20, 60),
+    "login_username": (5, 60),
+    "register_ip": (10, 3600),
+    "shoppingcar_token": (60, 60),
+    "account_token": (30, 60),
+    "export_ip": (20, 3600),
+    "export_token": (10, 3600),
+}
+# 课程列表缓存的过期时间(秒), 课程, 分类, 价格策略修改时通过版本号失效
+CATALOG_CACHE_TTL = 3600
+# 课程详细页面文档的重建延迟(秒), 最后一次修改之后这么长时间没有新的修改才重建
+COURSE_DOC_DEBOUNCE = 5
+# 不存在的课程的详细页面缓存时间(秒), 不存在的id不会每次都查询数据库
+COURSE_DOC_MISSING_TTL = 60
+# 列表接口的分页: 默认每页数量以及客户端可以指定的最大数量(page_size 参数)
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+# 流式导出时每批查询以及序列化的行数
+EXPORT_CHUNK_SIZE = 500
+# 课程搜索索引的快照文件, 进程启动时加载快照再应用之后的修改, 不需要从数据库重建
+SEARCH_SNAPSHOT_PATH = os.path.join(BASE_DIR, "search_index.pickle")
+# 课程章节树缓存的过期时间(秒), 章节和课时修改时通过版本号失效
+COURSE_CHAPTER_CACHE_TTL = 3600
+# 大于这个字节数的响应使用gzip压缩
+GZIP_MIN_LENGTH = 1024
+# json渲染使用的库: "auto" 依次尝试 orjson, ujson, 标准库; 也可以指定 "orjson", "ujson", "json"
+JSON_RENDERER_BACKEND = "auto"
+
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": (
+        "utils.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+}
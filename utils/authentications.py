@@ -1,11 +1,15 @@
 import time
 
-from django.core.cache import cache
+from django.conf import settings
 
-from course.models import Token
+from course.models import Account
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.authentication import BaseAuthentication
 
+from utils import token_cache
+from utils import signed_token
+from utils import token_store
+
 
 class UserAuthentication(BaseAuthentication):
     def authenticate(self, request):
@@ -18,28 +22,27 @@ class UserAuthentication(BaseAuthentication):
         if not token:
             raise AuthenticationFailed({"code": 1021, "error": "缺少token"})
 
-        # 在缓存中查找token有的化直接判断
-        ret = cache.get("token_" + token)
-        if ret:
-            print("保存到了缓存中了！！！！》》》》》》》》》》》》》》》》")
-            return ret, "token_" + token
-
-        # 数据库中获取获取token
-        ret_obj = Token.objects.filter(token=token).first()
+        # 签名token只需要校验签名和吊销列表, 不查询redis和数据库
+        if settings.TOKEN_AUTH_MODE == "signed":
+            user_id = signed_token.verify(token)
+            if user_id is None:
+                raise AuthenticationFailed({"code": 1022, "error": "认证失败"})
+            return Account(id=user_id), "token_" + token
+
+        # 在缓存(进程内 -> redis)中查找token有的化直接判断, 缓存中只有用户id和用户名, 不需要查询数据库
+        digest = token_store.make_digest(token)
+        identity = token_cache.get_identity(digest)
+        if identity:
+            return Account(**identity), "token_" + token
+
+        # 数据库中按摘要获取没有过期的token
+        ret_obj = token_store.lookup(digest)
         if not ret_obj:
             raise AuthenticationFailed({"code": 1022, "error": "认证失败"})
-        # 设定存活时间
-        # if datetime.datetime.now() - ret_obj.create_time > datetime.timedelta(days=14):
-        #     raise AuthenticationFailed("认证失效")
-
-        if time.time() - float(ret_obj.create_time) > 3600 * 24 * 14:
-            raise AuthenticationFailed("认证失败")
         # 数据库中查找到token值， 将token值添加到缓存中
         cache_token = "token_" + token
 
-        # delta = datetime.timedelta(days=14) - (datetime.datetime.now() - ret_obj.create_time)
-        # delta_num = datetime.timedelta(days=7)
-        delta = 3600 * 24 * 14 - (time.time() - float(ret_obj.create_time))
-        cache.set(cache_token, ret_obj.user, min(7 * 24 * 3600, delta))
+        delta = ret_obj.expire_time - time.time()
+        token_cache.set_identity(digest, ret_obj.user, min(7 * 24 * 3600, delta))
 
         return ret_obj.user, cache_token
@@ -0,0 +1,68 @@
+import json
+import struct
+
+import msgpack
+
+"""
+购物车以及结算数据在redis中的编码
+第一个字节是 schema 版本号, 解码时按照版本号选择编码器, 不需要 try json.loads
+旧数据是直接 json.dumps 的, 第一个字节是 "{" 或者 "[", 不会和版本号冲突, 按 json 解码
+结算数据使用 msgpack 编码, msgpack 是必须安装的依赖, 所有进程都能解码所有版本
+"""
+
+CART_ITEM_VERSION = 1
+MSGPACK_VERSION = 2
+
+
+class CartItemCodec(object):
+    """
+    购物车中的一门课程, 定长 9 个字节: 版本号, 价格策略id, 价格策略快照版本号
+    课程id是hash的field, 不需要再保存; lua脚本中用 struct.pack(">BII", ...) 写入同样的格式
+    """
+    version = CART_ITEM_VERSION
+    format = struct.Struct(">BII")
+
+    def dumps(self, value):
+        return self.format.pack(self.version, int(value["default_price_policy_id"]),
+                                int(value.get("price_version") or 0))
+
+    def loads(self, data):
+        _, price_policy_id, price_version = self.format.unpack(data)
+        return {"default_price_policy_id": price_policy_id, "price_version": price_version}
+
+
+class CodecError(ValueError):
+    """无法识别的编码版本"""
+
+
+class MsgpackCodec(object):
+    version = MSGPACK_VERSION
+
+    def dumps(self, value):
+        return bytes([self.version]) + msgpack.packb(value, use_bin_type=True)
+
+    def loads(self, data):
+        # strict_map_key=False: 课程id, 优惠券id 作为key
+        return msgpack.unpackb(data[1:], raw=False, strict_map_key=False)
+
+
+cart_item_codec = CartItemCodec()
+msgpack_codec = MsgpackCodec()
+
+# 结算中心使用的编码器
+account_codec = msgpack_codec
+
+CODECS = {codec.version: codec for codec in (cart_item_codec, msgpack_codec)}
+
+# 没有版本号的旧数据的第一个字节
+LEGACY_JSON_PREFIXES = (ord("{"), ord("["))
+
+
+def loads(data):
+    """按照第一个字节的版本号解码"""
+    codec = CODECS.get(data[0])
+    if codec is not None:
+        return codec.loads(data)
+    if data[0] in LEGACY_JSON_PREFIXES:
+        return json.loads(data.decode("utf-8"))
+    raise CodecError("未知的编码版本: {}".format(data[0]))
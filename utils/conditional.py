@@ -0,0 +1,49 @@
+import datetime
+
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django_redis import get_redis_connection
+
+from utils import versions
+
+"""
+根据资源的版本号(utils.versions)生成 ETag 和 Last-Modified
+客户端带 If-None-Match / If-Modified-Since 并且没有修改时直接返回 304, 不执行查询和序列化
+
+class CourseCategory(APIView):
+    @version_condition(lambda request: versions.CATEGORY)
+    def get(self, request):
+        ...
+"""
+
+
+def version_condition(resource_func):
+    """
+    :param resource_func: resource_func(request, *args, **kwargs) 返回资源名称, 或者多个资源名称的元组,
+        多个资源时任何一个修改 ETag 都会变化, Last-Modified 取最后修改的时间
+    """
+
+    def get_info(request, *args, **kwargs):
+        # etag 和 last_modified 共用一次 redis 读取
+        info = getattr(request, "_version_info", None)
+        if info is None:
+            resources = resource_func(request, *args, **kwargs)
+            if isinstance(resources, str):
+                resources = (resources,)
+            info = versions.get_info_many(get_redis_connection("default"), resources)
+            request._version_info = info
+        return info
+
+    def etag(request, *args, **kwargs):
+        # 带上修改时间, redis 数据丢失版本号重新计数时不会和旧的 ETag 相同
+        return "-".join("{}.{}".format(version, int((modified or 0) * 1000))
+                        for version, modified in get_info(request, *args, **kwargs))
+
+    def last_modified(request, *args, **kwargs):
+        modified = [modified for _, modified in get_info(request, *args, **kwargs) if modified is not None]
+        if not modified:
+            return None
+        return datetime.datetime.fromtimestamp(max(modified), timezone.utc)
+
+    return method_decorator(condition(etag_func=etag, last_modified_func=last_modified))
@@ -0,0 +1,105 @@
+from django.db import transaction
+from django.db.models import F, Case, When, Value, IntegerField
+
+from course.models import Course
+from utils import versions
+from utils import course_doc
+from utils.lua_script import call_script
+
+"""
+缓冲计数器
+计数时只在redis中 HINCRBY, flush_counters 命令定期把累计的增量一条 UPDATE 批量写入数据库, 热门课程不会频繁更新同一行
+需要最新值的读取合并数据库中的值和redis中还没有写入的增量
+
+counter_<表>_<字段> = hash {object_id: 还没有写入数据库的增量}
+counter_<表>_<字段>_flushing = 正在写入数据库的增量, 写入失败时下次重新写入
+
+新的计数器(浏览次数, 报名人数等)在 COUNTERS 中注册即可
+UPDATE 不会触发信号, 写入之后依赖这个字段的缓存在 on_flush 中处理
+每次计数时计数器的版本号(utils.versions, resource 属性)和这个对象的版本号(object_resource)+1,
+合并了增量的接口的 ETag 需要带上版本号: 列表使用计数器的版本号, 详细页面使用对象的版本号
+"""
+
+# 取出所有增量移动到处理中, 上一次没有处理完的先返回
+# KEYS: 计数器, 处理中
+TAKE_LUA = """
+if redis.call("EXISTS", KEYS[2]) == 0 then
+    if redis.call("EXISTS", KEYS[1]) == 0 then
+        return {}
+    end
+    redis.call("RENAME", KEYS[1], KEYS[2])
+end
+return redis.call("HGETALL", KEYS[2])
+"""
+
+
+class BufferedCounter(object):
+    def __init__(self, model, field, on_flush=None):
+        self.model = model
+        self.field = field
+        # on_flush(conn, 写入的对象id)
+        self.on_flush = on_flush
+        self.key = "counter_{}_{}".format(model._meta.model_name, field)
+        self.flushing_key = self.key + "_flushing"
+        self.resource = self.key
+
+    def incr(self, conn, object_id, amount=1):
+        """conn 可以是管道, 和管道中的其他命令一起执行"""
+        conn.hincrby(self.key, object_id, amount)
+        versions.touch(conn, self.resource, self.object_resource(object_id))
+
+    def object_resource(self, object_id):
+        """单个对象的版本号, 只包含一个对象的接口(详细页面)使用, 其他对象计数时 ETag 不变"""
+        return "{}_{}".format(self.resource, object_id)
+
+    def pending(self, conn, object_ids):
+        """:return: {object_id: 还没有写入数据库的增量}, 正在写入的也算在内"""
+        object_ids = [int(object_id) for object_id in object_ids]
+        if not object_ids:
+            return {}
+        pipe = conn.pipeline(transaction=False)
+        pipe.hmget(self.key, object_ids)
+        pipe.hmget(self.flushing_key, object_ids)
+        values, flushing = pipe.execute()
+        return {object_id: int(value or 0) + int(flushing_value or 0)
+                for object_id, value, flushing_value in zip(object_ids, values, flushing)
+                if value is not None or flushing_value is not None}
+
+    def merge(self, conn, rows, id_key="id", field=None):
+        """把增量加到已经序列化的数据上, rows 为字典的列表"""
+        field = field or self.field
+        pending = self.pending(conn, [row[id_key] for row in rows])
+        for row in rows:
+            row[field] += pending.get(int(row[id_key]), 0)
+        return rows
+
+    def flush(self, conn, batch_size=500):
+        """把增量写入数据库, 每 batch_size 个对象一条 UPDATE, :return: 写入的对象id"""
+        values = call_script(conn, TAKE_LUA, [self.key, self.flushing_key])
+        deltas = {int(values[index]): int(values[index + 1]) for index in range(0, len(values), 2)}
+        deltas = {object_id: delta for object_id, delta in deltas.items() if delta}
+        object_ids = sorted(deltas)
+        # 所有批次在一个事务中, 中途失败时全部回滚, 下次重新写入不会重复计数
+        with transaction.atomic():
+            for start in range(0, len(object_ids), batch_size):
+                batch = object_ids[start: start + batch_size]
+                self.model.objects.filter(id__in=batch).update(**{self.field: F(self.field) + Case(
+                    *[When(id=object_id, then=Value(deltas[object_id])) for object_id in batch],
+                    default=Value(0), output_field=IntegerField())})
+        # 写入数据库之后再删除, 中途失败下次重新写入
+        conn.delete(self.flushing_key)
+        if object_ids and self.on_flush:
+            self.on_flush(conn, object_ids)
+        return object_ids
+
+
+def study_num_flushed(conn, course_ids):
+    """课程列表的缓存和课程详细的文档中有学习人数"""
+    versions.bump(conn, versions.CATALOG)
+    course_doc.build_docs(conn, course_ids)
+
+
+# 课程的学习人数, 购买成功时 study_num.incr(conn, course_id)
+study_num = BufferedCounter(Course, "study_num", study_num_flushed)
+
+COUNTERS = [study_num]
@@ -0,0 +1,185 @@
+import datetime
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+
+from course.models import Course
+from course.models import CouponRecord
+from utils import codec
+from utils.lua_script import call_script
+
+"""
+每个用户可用优惠券的索引, 结算时不需要查询数据库
+couponindex_<user_id> = zset {record_id: 有效结束日期(date.toordinal())}
+coupondetail_<user_id> = {
+    "built": 1, 索引已经生成
+    record_id: codec.account_codec.dumps({
+        "id": record.id,
+        "object_id": 绑定的课程id, 通用优惠券为None,
+        "valid_begin": 有效开始日期(date.toordinal()),
+        "info": get_coupon_info(coupon),
+    }),
+}
+CouponRecord / Coupon 修改时通过信号更新索引, 过期的优惠券由 sweep_coupon_index 命令定期清理
+索引有过期时间(settings.COUPON_INDEX_TTL), 读取时刷新, 过期之后下次读取时重新生成
+"""
+
+INDEX_KEY = "couponindex_{}"
+DETAIL_KEY = "coupondetail_{}"
+
+# 读取有效期没有结束的优惠券
+# KEYS: 索引, 详情; ARGV: 今天, 过期时间
+# 返回 false 表示索引还没有生成
+READ_INDEX_LUA = """
+if redis.call("HEXISTS", KEYS[2], "built") == 0 then
+    return false
+end
+redis.call("EXPIRE", KEYS[1], ARGV[2])
+redis.call("EXPIRE", KEYS[2], ARGV[2])
+local ids = redis.call("ZRANGEBYSCORE", KEYS[1], ARGV[1], "+inf")
+if #ids == 0 then
+    return {}
+end
+return redis.call("HMGET", KEYS[2], unpack(ids))
+"""
+
+# 索引已经生成时才更新, 没有生成的下次读取时从数据库生成
+# KEYS: 索引, 详情; ARGV: record_id, 有效结束日期, 详情
+UPDATE_INDEX_LUA = """
+if redis.call("HEXISTS", KEYS[2], "built") == 0 then
+    return 0
+end
+redis.call("ZADD", KEYS[1], ARGV[2], ARGV[1])
+redis.call("HSET", KEYS[2], ARGV[1], ARGV[3])
+return 1
+"""
+
+# 删除有效期已经结束的优惠券
+# KEYS: 索引, 详情; ARGV: 昨天
+SWEEP_INDEX_LUA = """
+local ids = redis.call("ZRANGEBYSCORE", KEYS[1], "-inf", ARGV[1])
+if #ids == 0 then
+    return 0
+end
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", ARGV[1])
+redis.call("HDEL", KEYS[2], unpack(ids))
+return #ids
+"""
+
+
+def get_coupon_info(coupon):
+    """获取到的是优惠券对象， 不能传递到前端使用，需要重新构建数据结构"""
+    return {
+        "name": coupon.name,
+        "valid_end_date": coupon.get_coupon_type_display(),
+        "coupon_type": coupon.get_coupon_type_display(),
+        "minimum_consume": coupon.minimum_consume,
+        "money_equivalent_value": coupon.money_equivalent_value,
+        "off_percent": coupon.off_percent,
+    }
+
+
+def is_indexable(record):
+    """未使用, 绑定课程或者通用, 并且有有效期的优惠券才进入索引"""
+    coupon = record.coupon
+    return (record.status == 0
+            and coupon.content_type_id == ContentType.objects.get_for_model(Course).id
+            and coupon.valid_begin_date is not None
+            and coupon.valid_end_date is not None)
+
+
+def index_entry(record):
+    return {
+        "id": record.id,
+        "object_id": record.coupon.object_id,
+        "valid_begin": record.coupon.valid_begin_date.toordinal(),
+        "info": get_coupon_info(record.coupon),
+    }
+
+
+def build_index(conn, user_id):
+    """从数据库生成用户的索引, 一次查询"""
+    today = datetime.date.today()
+    coupon_records = CouponRecord.objects.filter(
+        user_id=user_id,
+        status=0,
+        coupon__content_type=ContentType.objects.get_for_model(Course),
+        coupon__valid_begin_date__isnull=False,
+        coupon__valid_end_date__gte=today,
+    ).select_related("coupon")
+
+    entries = []
+    pipe = conn.pipeline()
+    pipe.delete(INDEX_KEY.format(user_id), DETAIL_KEY.format(user_id))
+    for record in coupon_records:
+        entry = index_entry(record)
+        entries.append(entry)
+        pipe.zadd(INDEX_KEY.format(user_id), {record.id: record.coupon.valid_end_date.toordinal()})
+        pipe.hset(DETAIL_KEY.format(user_id), record.id, codec.account_codec.dumps(entry))
+    pipe.hset(DETAIL_KEY.format(user_id), "built", 1)
+    pipe.expire(INDEX_KEY.format(user_id), settings.COUPON_INDEX_TTL)
+    pipe.expire(DETAIL_KEY.format(user_id), settings.COUPON_INDEX_TTL)
+    pipe.execute()
+    return entries
+
+
+def get_user_coupons(conn, user_id):
+    """用户所有有效期没有结束的优惠券, 索引存在时只读取redis"""
+    keys = [INDEX_KEY.format(user_id), DETAIL_KEY.format(user_id)]
+    values = call_script(conn, READ_INDEX_LUA, keys, [datetime.date.today().toordinal(), settings.COUPON_INDEX_TTL])
+    if values is None:
+        return build_index(conn, user_id)
+    return [codec.loads(value) for value in values if value is not None]
+
+
+def update_index(conn, record):
+    """优惠券记录修改后更新用户的索引"""
+    keys = [INDEX_KEY.format(record.user_id), DETAIL_KEY.format(record.user_id)]
+    if is_indexable(record):
+        args = [record.id, record.coupon.valid_end_date.toordinal(), codec.account_codec.dumps(index_entry(record))]
+        call_script(conn, UPDATE_INDEX_LUA, keys, args)
+    else:
+        remove_from_index(conn, record.user_id, record.id)
+
+
+def invalidate_index(conn, user_ids):
+    """删除用户的索引, 下次读取时从数据库重新生成"""
+    keys = []
+    for user_id in user_ids:
+        keys.extend([INDEX_KEY.format(user_id), DETAIL_KEY.format(user_id)])
+    if keys:
+        conn.delete(*keys)
+
+
+def remove_from_index(conn, user_id, record_id):
+    pipe = conn.pipeline()
+    pipe.zrem(INDEX_KEY.format(user_id), record_id)
+    pipe.hdel(DETAIL_KEY.format(user_id), record_id)
+    pipe.execute()
+
+
+def sweep_index(conn, user_id):
+    """删除有效期已经结束的优惠券, 返回删除的数量"""
+    yesterday = datetime.date.today().toordinal() - 1
+    return call_script(conn, SWEEP_INDEX_LUA, [INDEX_KEY.format(user_id), DETAIL_KEY.format(user_id)], [yesterday])
+
+
+def resolve_coupons(conn, user, course_ids):
+    """
+    结算时取出用户的课程优惠券以及通用优惠券, 在内存中按照课程分组
+    查询条件：1， 用户对象， 2， content_type，3 相关课程(通用优惠券没有绑定课程)
+        4，未使用并且在有效期内
+    :return: ({course_id: {record_id: coupon_info}}, {record_id: coupon_info})
+    """
+    today = datetime.date.today().toordinal()
+    course_ids = [int(course_id) for course_id in course_ids]
+    course_coupon_info = {course_id: {} for course_id in course_ids}
+    gengeal_coupon_info = {}
+    for entry in get_user_coupons(conn, user.id):
+        if entry["valid_begin"] > today:
+            continue
+        if entry["object_id"] is None:
+            gengeal_coupon_info[entry["id"]] = entry["info"]
+        elif entry["object_id"] in course_coupon_info:
+            course_coupon_info[entry["object_id"]][entry["id"]] = entry["info"]
+    return course_coupon_info, gengeal_coupon_info
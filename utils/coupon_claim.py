@@ -0,0 +1,181 @@
+import time
+import uuid
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from course.models import Coupon
+from course.models import CouponRecord
+from utils import coupon
+from utils.lua_script import call_script
+
+"""
+优惠券秒杀领取
+活动开始前把剩余数量以及已经领取的用户预热到redis中, 领取时在lua脚本中原子地校验并扣减库存,
+领取记录先放到队列中, 由 flush_coupon_claims 命令批量写入数据库, 领取时不会锁数据库的行
+
+couponstock_<coupon_id> = {"stock": 剩余数量, "open": 领取开始日期, "close": 领取结束日期}
+couponclaimed_<coupon_id> = set(user_id, ...)
+couponclaim_queue = ["coupon_id:user_id:timestamp", ...]
+couponclaim_lock = 正在批量写入的进程, 同一时间只有一个进程写入
+"""
+
+STOCK_KEY = "couponstock_{}"
+CLAIMED_KEY = "couponclaimed_{}"
+QUEUE_KEY = "couponclaim_queue"
+# 正在写入数据库的领取记录, 写入失败时下次重新写入
+PROCESSING_KEY = "couponclaim_processing"
+LOCK_KEY = "couponclaim_lock"
+
+# 领取的返回值
+CLAIM_OK = 1
+CLAIM_SOLD_OUT = 0
+CLAIM_NOT_PRELOADED = -1
+CLAIM_NOT_OPEN = -2
+CLAIM_ALREADY = -3
+
+# KEYS: 库存, 已领取的用户, 队列
+# ARGV: user_id, 今天, 领取记录
+CLAIM_LUA = """
+local campaign = redis.call("HMGET", KEYS[1], "stock", "open", "close")
+if not campaign[1] then
+    return -1
+end
+local today = tonumber(ARGV[2])
+if today < tonumber(campaign[2]) or today > tonumber(campaign[3]) then
+    return -2
+end
+if redis.call("SISMEMBER", KEYS[2], ARGV[1]) == 1 then
+    return -3
+end
+if tonumber(campaign[1]) <= 0 then
+    return 0
+end
+redis.call("HINCRBY", KEYS[1], "stock", -1)
+redis.call("SADD", KEYS[2], ARGV[1])
+redis.call("RPUSH", KEYS[3], ARGV[3])
+return 1
+"""
+
+# 把队列中最多 ARGV[1] 条记录移动到处理中的列表, 上一次没有处理完的先返回
+# KEYS: 队列, 处理中
+TAKE_BATCH_LUA = """
+if redis.call("EXISTS", KEYS[2]) == 1 then
+    return redis.call("LRANGE", KEYS[2], 0, -1)
+end
+local batch = redis.call("LRANGE", KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #batch == 0 then
+    return batch
+end
+redis.call("LTRIM", KEYS[1], #batch, -1)
+redis.call("RPUSH", KEYS[2], unpack(batch))
+return batch
+"""
+
+# 释放自己持有的锁
+# KEYS: 锁
+# ARGV: 加锁时的值
+RELEASE_LOCK_LUA = """
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+"""
+
+# 预热一个活动, 活动进行中也可以重新预热:
+# 已领取的用户 = redis中已有的 + 数据库中的 + 队列和处理中还没有写入数据库的, 只增加不删除, 剩余数量按这个集合重新计算
+# KEYS: 库存, 已领取的用户, 队列, 处理中
+# ARGV: coupon_id, 总数量, 领取开始日期, 领取结束日期, 数据库中已经领取的用户id...
+PRELOAD_LUA = """
+for i = 5, #ARGV do
+    redis.call("SADD", KEYS[2], ARGV[i])
+end
+local prefix = ARGV[1] .. ":"
+for _, key in ipairs({KEYS[3], KEYS[4]}) do
+    for _, item in ipairs(redis.call("LRANGE", key, 0, -1)) do
+        if string.sub(item, 1, #prefix) == prefix then
+            redis.call("SADD", KEYS[2], string.match(item, "^[^:]+:([^:]+):"))
+        end
+    end
+end
+local stock = math.max(tonumber(ARGV[2]) - redis.call("SCARD", KEYS[2]), 0)
+redis.call("HMSET", KEYS[1], "stock", stock, "open", ARGV[3], "close", ARGV[4])
+return stock
+"""
+
+
+def claim(conn, coupon_id, user_id):
+    """领取优惠券, 一次往返, 返回 CLAIM_*"""
+    keys = [STOCK_KEY.format(coupon_id), CLAIMED_KEY.format(coupon_id), QUEUE_KEY]
+    record = "{}:{}:{}".format(coupon_id, user_id, time.time())
+    return call_script(conn, CLAIM_LUA, keys, [user_id, datetime.date.today().toordinal(), record])
+
+
+def flush_claims(conn, batch_size=1000):
+    """
+    把队列中的领取记录批量写入数据库, 返回写入的数量
+    每批写入时持有锁, 其他进程正在写入时直接返回, 不会重复写入同一批记录
+    """
+    total = 0
+    while True:
+        lock = uuid.uuid4().hex
+        if not conn.set(LOCK_KEY, lock, nx=True, ex=settings.COUPON_FLUSH_LOCK_TIMEOUT):
+            return total
+        try:
+            count = flush_batch(conn, batch_size)
+        finally:
+            call_script(conn, RELEASE_LOCK_LUA, [LOCK_KEY], [lock])
+        if count is None:
+            return total
+        total += count
+
+
+def flush_batch(conn, batch_size):
+    """写入一批, 需要持有锁; 队列为空返回None"""
+    batch = call_script(conn, TAKE_BATCH_LUA, [QUEUE_KEY, PROCESSING_KEY], [batch_size])
+    if not batch:
+        return None
+    claims = []
+    for item in batch:
+        coupon_id, user_id, timestamp = item.decode("utf-8").split(":")
+        claims.append((int(coupon_id), int(user_id), float(timestamp)))
+
+    # 上一次写入数据库之后没有来得及删除处理中的列表, 跳过已经写入的记录
+    existing = set(CouponRecord.objects.filter(
+        coupon_id__in={coupon_id for coupon_id, _, _ in claims},
+        user_id__in={user_id for _, user_id, _ in claims},
+    ).values_list("coupon_id", "user_id"))
+    records = [
+        CouponRecord(coupon_id=coupon_id, user_id=user_id,
+                     get_time=datetime.datetime.fromtimestamp(timestamp, tz=timezone.utc))
+        for coupon_id, user_id, timestamp in claims if (coupon_id, user_id) not in existing
+    ]
+    CouponRecord.objects.bulk_create(records, batch_size=batch_size)
+    conn.delete(PROCESSING_KEY)
+    # bulk_create 不会触发信号, 删除这些用户的优惠券索引, 下次读取时重新生成
+    coupon.invalidate_index(conn, {record.user_id for record in records})
+    return len(records)
+
+
+def preload(conn, coupon_obj, flush=True):
+    """
+    预热一个活动: 剩余数量 = 总数量 - 已经领取的数量
+    已经领取的用户只增加不删除, 活动进行中重新预热不会丢失还没有写入数据库的领取记录
+    :return: 剩余数量
+    """
+    if flush:
+        flush_claims(conn)
+    claimed = list(CouponRecord.objects.filter(coupon=coupon_obj).values_list("user_id", flat=True))
+    keys = [STOCK_KEY.format(coupon_obj.id), CLAIMED_KEY.format(coupon_obj.id), QUEUE_KEY, PROCESSING_KEY]
+    args = [coupon_obj.id, coupon_obj.quantity, coupon_obj.open_date.toordinal(), coupon_obj.close_date.toordinal()]
+    return call_script(conn, PRELOAD_LUA, keys, args + claimed)
+
+
+def preload_all(conn, coupon_ids=None):
+    """预热领取时间没有结束的活动, 返回 {coupon_id: 剩余数量}"""
+    flush_claims(conn)
+    queryset = Coupon.objects.filter(close_date__gte=datetime.date.today())
+    if coupon_ids:
+        queryset = queryset.filter(id__in=coupon_ids)
+    return {coupon_obj.id: preload(conn, coupon_obj, flush=False) for coupon_obj in queryset}
@@ -0,0 +1,42 @@
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from course.models import CourseChapter
+from utils import versions
+
+"""
+课程的章节 -> 课时树
+章节和课时一次 left join 查询, 在内存中分组; 结果按章节的版本号(versions.CHAPTER)缓存, 章节或课时修改时失效
+"""
+
+CACHE_KEY = "chaptertree_{}_{}"
+
+
+def build_tree(course_id):
+    rows = CourseChapter.objects.filter(course_id=course_id).order_by(
+        "id", "course_sections__section_order", "course_sections__id").values_list(
+        "id", "title", "chapter", "course_id",
+        "course_sections__id", "course_sections__title",
+        "course_sections__free_trail", "course_sections__section_type")
+    chapters = OrderedDict()
+    for chapter_id, title, chapter, course, section_id, section_title, free_trail, section_type in rows:
+        item = chapters.get(chapter_id)
+        if item is None:
+            item = chapters[chapter_id] = OrderedDict(
+                (("id", chapter_id), ("title", title), ("chapter", chapter), ("course", course), ("sections", [])))
+        # 没有课时的章节 left join 出一行空的课时
+        if section_id is not None:
+            item["sections"].append({"id": section_id, "title": section_title,
+                                     "free_trail": free_trail, "section_type": section_type})
+    return list(chapters.values())
+
+
+def get_tree(conn, course_id):
+    key = CACHE_KEY.format(course_id, versions.get_version(conn, versions.CHAPTER.format(course_id)))
+    tree = cache.get(key)
+    if tree is None:
+        tree = build_tree(course_id)
+        cache.set(key, tree, settings.COURSE_CHAPTER_CACHE_TTL)
+    return tree
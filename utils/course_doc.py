@@ -0,0 +1,98 @@
+import json
+import time
+
+from django.conf import settings
+
+from course.models import CourseDetail
+from course.serializers import CourseDetailSerializer
+from utils import versions
+from utils.lua_script import call_script
+
+"""
+课程详细页面的预生成文档, 详细页面只需要读取一个key
+课程以及相关的数据(课程详细, 大纲, 讲师, 价格策略, 推荐课程)修改时通过信号把课程标记为需要重建,
+rebuild_course_docs 命令在最后一次修改之后 COURSE_DOC_DEBOUNCE 秒重建, 连续修改只重建一次
+
+coursedoc_<course_id> = json.dumps(CourseDetailSerializer(...).data), 课程不存在时为空字符串, 过期时间 COURSE_DOC_MISSING_TTL
+coursedoc_dirty = zset {course_id: 最后一次修改的时间}
+"""
+
+DOC_KEY = "coursedoc_{}"
+DIRTY_KEY = "coursedoc_dirty"
+# 课程不存在
+MISSING = b""
+
+# 取出一批可以重建的课程
+# KEYS: 需要重建的课程
+# ARGV: 截止时间, 数量
+TAKE_DIRTY_LUA = """
+local course_ids = redis.call("ZRANGEBYSCORE", KEYS[1], "-inf", ARGV[1], "LIMIT", 0, ARGV[2])
+if #course_ids > 0 then
+    redis.call("ZREM", KEYS[1], unpack(course_ids))
+end
+return course_ids
+"""
+
+
+def mark_dirty(conn, course_ids):
+    """标记需要重建, 重复修改只会推迟重建时间"""
+    now = time.time()
+    mapping = {course_id: now for course_id in course_ids}
+    if mapping:
+        conn.zadd(DIRTY_KEY, mapping)
+
+
+def build_docs(conn, course_ids):
+    """
+    从数据库生成文档, 课程详细以及相关的数据批量查询
+    :return: {course_id: 文档}, 课程不存在的删除文档, 不返回
+    """
+    queryset = CourseDetail.objects.filter(course_id__in=course_ids).select_related("course").prefetch_related(
+        "course__price_policy", "course_outline", "recommend_courses", "teachers")
+    docs = {str(detail.course_id): json.dumps(CourseDetailSerializer(detail).data, ensure_ascii=False)
+            for detail in queryset}
+    pipe = conn.pipeline(transaction=False)
+    for course_id in course_ids:
+        doc = docs.get(str(course_id))
+        if doc is None:
+            pipe.getset(DOC_KEY.format(course_id), MISSING)
+            pipe.expire(DOC_KEY.format(course_id), settings.COURSE_DOC_MISSING_TTL)
+        else:
+            pipe.set(DOC_KEY.format(course_id), doc)
+    values = iter(pipe.execute())
+    # 详细页面的 ETag, 只有文档写入或者删除时修改; 一直不存在的课程不修改, 不会为任意的id留下版本号
+    changed = []
+    for course_id in course_ids:
+        if str(course_id) in docs:
+            next(values)
+            changed.append(course_id)
+        else:
+            old_doc = next(values)
+            next(values)
+            if old_doc:
+                changed.append(course_id)
+    if changed:
+        versions.bump(conn, *[versions.COURSE_DOC.format(course_id) for course_id in changed])
+    return docs
+
+
+def get_doc(conn, course_id):
+    """读取文档, 还没有生成的同步生成; 课程不存在返回None"""
+    doc = conn.get(DOC_KEY.format(course_id))
+    if doc == MISSING:
+        return None
+    if doc is None:
+        doc = build_docs(conn, [course_id]).get(str(course_id))
+        if doc is None:
+            return None
+    return json.loads(doc)
+
+
+def rebuild_dirty(conn, batch_size):
+    """重建最后一次修改已经超过 COURSE_DOC_DEBOUNCE 秒的课程, 返回重建的数量"""
+    course_ids = call_script(conn, TAKE_DIRTY_LUA, [DIRTY_KEY],
+                             [time.time() - settings.COURSE_DOC_DEBOUNCE, batch_size])
+    course_ids = [int(course_id) for course_id in course_ids]
+    if course_ids:
+        build_docs(conn, course_ids)
+    return len(course_ids)
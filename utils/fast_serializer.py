@@ -0,0 +1,46 @@
+from collections import OrderedDict
+
+"""
+只读的快速序列化, 从 queryset.values() 的字典生成和 ModelSerializer 完全相同的数据
+字段列表在定义类的时候编译一次, 每一行只做字典取值和转换函数调用, 没有字段实例化和方法分发
+
+class CategoryFastSerializer(FastSerializer):
+    fields = (
+        ("id", "id", None),
+        ("title", "title", None),
+    )
+
+FastSerializer(queryset.values(*CategoryFastSerializer.columns), many=True).data
+"""
+
+
+class FastSerializerMeta(type):
+    def __new__(mcs, name, bases, attrs):
+        cls = super(FastSerializerMeta, mcs).__new__(mcs, name, bases, attrs)
+        # values() 需要查询的字段
+        cls.columns = tuple(OrderedDict((column, None) for _, column, _ in cls.fields))
+        return cls
+
+
+class FastSerializer(object, metaclass=FastSerializerMeta):
+    """
+    fields = ((输出名称, values字段, 转换函数), ...)
+    转换函数为None时直接输出, 为字符串时使用同名方法(可以使用 prepare 中准备的数据)
+    """
+    fields = ()
+
+    def __init__(self, rows, many=True):
+        # 和 DRF 的序列化器使用方式相同, 只支持 many=True
+        self.rows = rows
+
+    def prepare(self, rows):
+        """序列化之前批量准备数据, 例如一次查询关联的数据"""
+
+    @property
+    def data(self):
+        rows = list(self.rows)
+        self.prepare(rows)
+        fields = [(name, column, getattr(self, converter) if isinstance(converter, str) else converter)
+                  for name, column, converter in self.fields]
+        return [OrderedDict([(name, convert(row[column]) if convert else row[column])
+                             for name, column, convert in fields]) for row in rows]
@@ -0,0 +1,18 @@
+"""
+redis lua 脚本
+每个脚本在进程内只注册一次, 之后通过 evalsha 调用, 服务端没有缓存脚本时 redis-py 会自动重新加载
+"""
+
+_scripts = {}
+
+
+def get_script(conn, source):
+    script = _scripts.get(source)
+    if script is None:
+        script = _scripts[source] = conn.register_script(source)
+    return script
+
+
+def call_script(conn, source, keys=(), args=()):
+    """conn 可以是连接也可以是管道"""
+    return get_script(conn, source)(keys=list(keys), args=list(args), client=conn)
@@ -0,0 +1,72 @@
+import json
+import base64
+
+from django.conf import settings
+from django.db.models import Q
+
+"""
+游标分页(keyset), 按排序字段的值定位下一页, 不使用 offset, 翻到多少页都只扫描一页的数据
+游标是上一页最后一行排序字段的值, base64 编码之后返回给客户端:
+    ?cursor=<上一页返回的next>&page_size=20
+"""
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class KeysetPagination(object):
+    """
+    :param ordering: 排序字段, 例如 ("-order", "-id"), 最后一个字段必须唯一, 需要有对应的联合索引
+    """
+
+    def __init__(self, ordering):
+        self.ordering = ordering
+        self.fields = [field.lstrip("-") for field in ordering]
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get("page_size", settings.PAGE_SIZE))
+        except (TypeError, ValueError):
+            raise InvalidCursor("page_size")
+        return max(1, min(page_size, settings.MAX_PAGE_SIZE))
+
+    def encode_cursor(self, row):
+        """row 可以是模型对象, 也可以是 values() 的字典"""
+        values = [str(row[field] if isinstance(row, dict) else getattr(row, field)) for field in self.fields]
+        return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+    def decode_cursor(self, model, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+            if len(values) != len(self.fields):
+                raise ValueError(cursor)
+            return [model._meta.get_field(field).to_python(value) for field, value in zip(self.fields, values)]
+        except Exception:
+            raise InvalidCursor(cursor)
+
+    def after(self, values):
+        """(a, b) 之后的行: a 在之后, 或者 a 相同 b 在之后"""
+        condition = None
+        for field, ordering, value in reversed(list(zip(self.fields, self.ordering, values))):
+            lookup = "{}__{}".format(field, "lt" if ordering.startswith("-") else "gt")
+            if condition is None:
+                condition = Q(**{lookup: value})
+            else:
+                condition = Q(**{lookup: value}) | (Q(**{field: value}) & condition)
+        return condition
+
+    def paginate(self, queryset, request):
+        """
+        :return: (这一页的数据, 下一页的游标), 最后一页的游标为None
+        :raise InvalidCursor: 游标或者page_size不合法
+        """
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get("cursor")
+        if cursor:
+            queryset = queryset.filter(self.after(self.decode_cursor(queryset.model, cursor)))
+        # 多取一行判断是否还有下一页
+        rows = list(queryset[:page_size + 1])
+        next_cursor = self.encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+        return rows[:page_size], next_cursor
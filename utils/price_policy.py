@@ -0,0 +1,97 @@
+import json
+
+from django.contrib.contenttypes.models import ContentType
+
+from course.models import Course
+from course.models import PricePolicy
+
+"""
+每个课程一份价格策略快照, 所有用户的购物车共用, 购物车里只保存课程id, 选择的价格策略id和快照版本号
+价格策略或者课程修改时通过信号把版本号+1, 并删除快照, 下次读取的时候重新生成
+
+pricepolicy_version_<course_id> = 版本号
+pricepolicy_<course_id> = {
+    "version": 生成快照时的版本号,
+    "title": course.title,
+    "policies": ",1,2,3,", 所有价格策略的id, 给lua脚本校验使用
+    "price_dict": json.dumps({
+        policy_id: {
+            "price": item.price,
+            "valid_period": item.valid_period,
+            "valid_period_id": item.get_valid_period_display(),
+        },
+    }),
+}
+"""
+
+VERSION_KEY = "pricepolicy_version_{}"
+SNAPSHOT_KEY = "pricepolicy_{}"
+
+
+def invalidate(conn, course_id):
+    """价格策略或课程修改后调用, 版本号+1 并删除快照"""
+    pipe = conn.pipeline()
+    pipe.incr(VERSION_KEY.format(course_id))
+    pipe.delete(SNAPSHOT_KEY.format(course_id))
+    pipe.execute()
+
+
+def get_snapshots(conn, course_ids):
+    """
+    一个管道取出多个课程的价格策略快照, 缺失或者过期的快照一次查询重新生成
+    :return: {course_id: {"version": ..., "title": ..., "price_dict": {...}}}, 课程不存在的不返回
+    """
+    course_ids = [str(course_id) for course_id in course_ids]
+    pipe = conn.pipeline(transaction=False)
+    for course_id in course_ids:
+        pipe.get(VERSION_KEY.format(course_id))
+        pipe.hgetall(SNAPSHOT_KEY.format(course_id))
+    values = pipe.execute()
+
+    snapshots = {}
+    missing = {}
+    for index, course_id in enumerate(course_ids):
+        version = int(values[index * 2] or 0)
+        snapshot = values[index * 2 + 1]
+        if snapshot and b"policies" in snapshot and int(snapshot[b"version"]) == version:
+            snapshots[course_id] = {
+                "version": version,
+                "title": snapshot[b"title"].decode("utf-8"),
+                "price_dict": json.loads(snapshot[b"price_dict"].decode("utf-8")),
+            }
+        else:
+            missing[course_id] = version
+    if missing:
+        snapshots.update(build_snapshots(conn, missing))
+    return snapshots
+
+
+def build_snapshots(conn, versions):
+    """
+    从数据库生成快照, 课程一次查询, 价格策略一次查询
+    :param versions: {course_id: 读取时的版本号}, 生成期间版本号变化的快照下次读取时会被丢弃
+    """
+    course_dict = Course.objects.only("id", "title").in_bulk([int(course_id) for course_id in versions])
+    content_type = ContentType.objects.get_for_model(Course)
+    price_queryset = PricePolicy.objects.filter(content_type=content_type, object_id__in=course_dict.keys())
+
+    snapshots = {}
+    for course_id, course_obj in course_dict.items():
+        snapshots[str(course_id)] = {"version": versions[str(course_id)], "title": course_obj.title, "price_dict": {}}
+    for price in price_queryset:
+        snapshots[str(price.object_id)]["price_dict"][str(price.id)] = {
+            "price": price.price,
+            "valid_period": price.valid_period,
+            "valid_period_id": price.get_valid_period_display(),
+        }
+
+    pipe = conn.pipeline(transaction=False)
+    for course_id, snapshot in snapshots.items():
+        pipe.hmset(SNAPSHOT_KEY.format(course_id), {
+            "version": snapshot["version"],
+            "title": snapshot["title"],
+            "policies": ",{},".format(",".join(snapshot["price_dict"])),
+            "price_dict": json.dumps(snapshot["price_dict"]),
+        })
+    pipe.execute()
+    return snapshots
@@ -0,0 +1,109 @@
+import numpy as np
+
+from course.models import Coupon
+
+"""
+结算价格计算
+规则:
+    1, 课程优惠券只能用在绑定的课程上, 每门课程最多使用一张
+    2, 通用优惠券每个订单最多使用一张, 在课程优惠券之后使用
+    3, 满减券的门槛按照原价计算(课程优惠券按课程原价, 通用优惠券按订单原价)
+    4, 立减券减到0为止
+在这个规则下每门课程的最优选择互不影响, 所有 优惠券 x 课程 的组合用一个矩阵一次算出,
+通用优惠券在课程优惠券之后对所有通用优惠券一次算出
+"""
+
+# 立减券, 满减券, 折扣券
+FIXED, THRESHOLD, PERCENT = 0, 1, 2
+
+# coupon_info 中保存的是 get_coupon_type_display()
+COUPON_TYPES = {display: coupon_type for coupon_type, display in Coupon.coupon_type_choice}
+
+
+def coupon_arrays(coupons):
+    """[coupon_info, ...] -> 类型, 面额, 门槛, 折扣 四个数组"""
+    coupon_type = np.array([COUPON_TYPES[info["coupon_type"]] for info in coupons], dtype=np.int8)
+    value = np.array([info["money_equivalent_value"] or 0 for info in coupons], dtype=np.float64)
+    minimum = np.array([info["minimum_consume"] or 0 for info in coupons], dtype=np.float64)
+    off = np.array([100 if info["off_percent"] is None else info["off_percent"] for info in coupons],
+                   dtype=np.float64)
+    return coupon_type, value, minimum, off
+
+
+def apply_coupons(price, base, coupon_type, value, minimum, off):
+    """
+    计算使用优惠券之后的价格, 参数都可以广播
+    :param price: 使用优惠券之前的价格
+    :param base: 满减券门槛比较的原价
+    """
+    return np.where(
+        coupon_type == FIXED, np.maximum(price - value, 0),
+        np.where(coupon_type == THRESHOLD,
+                 np.where(base >= minimum, np.maximum(price - value, 0), price),
+                 price * off / 100))
+
+
+def best_discount(items, course_coupons, gengeal_coupons):
+    """
+    计算最优的优惠券组合
+    :param items: [(course_id, price), ...]
+    :param course_coupons: {course_id: {record_id: coupon_info}}
+    :param gengeal_coupons: {record_id: coupon_info}
+    :return: {"original_total", "total", "discount", "gengeal_coupon_id", "items": [...]}
+    """
+    course_ids = [int(course_id) for course_id, _ in items]
+    prices = np.array([price for _, price in items], dtype=np.float64)
+    item_index = {course_id: index for index, course_id in enumerate(course_ids)}
+
+    # 展开所有课程优惠券, 记录每张优惠券绑定的课程在 items 中的位置
+    coupon_ids = []
+    coupon_item = []
+    coupons = []
+    for course_id, coupon_dict in course_coupons.items():
+        if int(course_id) not in item_index:
+            continue
+        for record_id, info in coupon_dict.items():
+            coupon_ids.append(int(record_id))
+            coupon_item.append(item_index[int(course_id)])
+            coupons.append(info)
+
+    final = prices.copy()
+    chosen = np.full(len(items), -1)
+    if coupons:
+        coupon_type, value, minimum, off = coupon_arrays(coupons)
+        # 优惠券 x 课程 的价格矩阵, 不能使用的组合为 inf
+        matrix = apply_coupons(prices[None, :], prices[None, :], coupon_type[:, None],
+                               value[:, None], minimum[:, None], off[:, None])
+        eligible = np.array(coupon_item)[:, None] == np.arange(len(items))[None, :]
+        matrix = np.where(eligible, matrix, np.inf)
+        best = matrix.argmin(axis=0)
+        best_price = matrix[best, np.arange(len(items))]
+        use = best_price < prices
+        final = np.where(use, best_price, prices)
+        chosen = np.where(use, np.array(coupon_ids)[best], -1)
+
+    original_total = float(prices.sum())
+    subtotal = float(final.sum())
+    total = subtotal
+    gengeal_coupon_id = None
+    if gengeal_coupons:
+        gengeal_ids = [int(record_id) for record_id in gengeal_coupons]
+        coupon_type, value, minimum, off = coupon_arrays(list(gengeal_coupons.values()))
+        totals = apply_coupons(subtotal, original_total, coupon_type, value, minimum, off)
+        best = int(totals.argmin())
+        if totals[best] < subtotal:
+            total = float(totals[best])
+            gengeal_coupon_id = gengeal_ids[best]
+
+    return {
+        "original_total": round(original_total, 2),
+        "total": round(total, 2),
+        "discount": round(original_total - total, 2),
+        "gengeal_coupon_id": gengeal_coupon_id,
+        "items": [{
+            "course_id": course_id,
+            "price": round(float(price), 2),
+            "final_price": round(float(final_price), 2),
+            "coupon_id": None if coupon_id == -1 else int(coupon_id),
+        } for course_id, price, final_price, coupon_id in zip(course_ids, prices, final, chosen)],
+    }
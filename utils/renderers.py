@@ -0,0 +1,53 @@
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+"""
+更快的json渲染, 按 settings.JSON_RENDERER_BACKEND 选择:
+    "auto": 依次使用 orjson, ujson, 都没有安装时使用标准库(DRF 的 JSONRenderer)
+    "orjson" / "ujson" / "json": 指定使用, 没有安装时使用标准库
+orjson 直接支持 datetime, date, uuid; Decimal 以及 DRF 的延迟翻译字符串等使用 DRF 的 JSONEncoder 转换
+"""
+
+_encoder = JSONEncoder()
+
+
+def get_backend():
+    backend = getattr(settings, "JSON_RENDERER_BACKEND", "auto")
+    if backend in ("auto", "orjson") and orjson is not None:
+        return "orjson"
+    if backend in ("auto", "ujson") and ujson is not None:
+        return "ujson"
+    return "json"
+
+
+class FastJSONRenderer(JSONRenderer):
+    """输出格式和 DRF 的 JSONRenderer 相同: 紧凑, 中文不转义"""
+
+    def __init__(self):
+        self.backend = get_backend()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        # 需要缩进(浏览器调试)时使用标准库
+        if self.backend == "json" or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super(FastJSONRenderer, self).render(data, accepted_media_type, renderer_context)
+        if self.backend == "orjson":
+            # 非字符串的key(例如优惠券记录id)转换为字符串, 和标准库相同
+            return orjson.dumps(data, default=_encoder.default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z)
+        try:
+            return ujson.dumps(data, ensure_ascii=False, escape_forward_slashes=False).encode("utf-8")
+        except (TypeError, OverflowError):
+            # ujson 不支持的类型(Decimal, datetime 等)
+            return super(FastJSONRenderer, self).render(data, accepted_media_type, renderer_context)
@@ -0,0 +1,197 @@
+import os
+import re
+import math
+import heapq
+import pickle
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+
+from course.models import Course
+from utils.lua_script import call_script
+
+"""
+进程内的课程搜索, 倒排索引
+中文按字切分为单字和相邻两个字(2-gram), 英文和数字按单词切分, 查询使用同样的切分
+评分: 每个词在课程中的权重(字段权重 * 出现次数) * idf
+
+增量更新: 课程或课程详细修改时信号把课程id写入 search_changes, 每次搜索之前取出上次之后的修改重新索引
+search_seq = 修改序号
+search_changes = zset {course_id: 最后一次修改的序号}
+快照: build_search_index 命令把索引和序号保存到 SEARCH_SNAPSHOT_PATH, 进程启动时加载快照, 再应用快照之后的修改
+"""
+
+SEQ_KEY = "search_seq"
+CHANGES_KEY = "search_changes"
+
+# 字段权重
+FIELD_WEIGHTS = (
+    ("title", 3),
+    ("brief", 1),
+    ("summary", 1),
+    ("what_to_study_brief", 1),
+)
+
+# 取序号和写入修改在一个脚本中完成, 否则序号大的修改可能先写入, 读取之后跳过序号小的修改
+# KEYS: 序号, 修改
+# ARGV: 课程id
+MARK_CHANGED_LUA = """
+for i = 1, #ARGV do
+    redis.call("ZADD", KEYS[2], redis.call("INCR", KEYS[1]), ARGV[i])
+end
+return #ARGV
+"""
+
+TOKEN_RE = re.compile(r"[\u4e00-\u9fff]+|[a-z0-9]+")
+
+
+def tokenize(text, query=False):
+    """
+    中文: 单字 + 2-gram; 英文数字: 单词
+    :param query: 查询时两个字以上的中文只使用 2-gram, 单字的倒排列表很长, 只在查询一个字时使用
+    """
+    tokens = []
+    for run in TOKEN_RE.findall((text or "").lower()):
+        if run[0] >= "\u4e00":
+            if not query or len(run) == 1:
+                tokens.extend(run)
+            tokens.extend(run[i: i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+def course_fields(course_ids=None):
+    """课程以及课程详细一次查询, :return: {course_id: {字段: 内容}}"""
+    queryset = Course.objects.all()
+    if course_ids is not None:
+        queryset = queryset.filter(id__in=course_ids)
+    rows = queryset.values_list("id", "title", "brief", "coursedetail__summary", "coursedetail__what_to_study_brief")
+    return {row[0]: dict(zip((field for field, _ in FIELD_WEIGHTS), row[1:])) for row in rows}
+
+
+class SearchIndex(object):
+    def __init__(self):
+        # {词: {course_id: 权重}}
+        self.postings = defaultdict(dict)
+        # {course_id: {"title": ..., "brief": ..., "terms": {词: 权重}}}
+        self.docs = {}
+        # 已经应用的修改序号
+        self.seq = 0
+        self.lock = threading.Lock()
+
+    def add(self, course_id, fields):
+        terms = defaultdict(int)
+        for field, weight in FIELD_WEIGHTS:
+            for token in tokenize(fields.get(field)):
+                terms[token] += weight
+        self.remove(course_id)
+        self.docs[course_id] = {"title": fields["title"], "brief": fields["brief"], "terms": dict(terms)}
+        for term, weight in terms.items():
+            self.postings[term][course_id] = weight
+
+    def remove(self, course_id):
+        doc = self.docs.pop(course_id, None)
+        if doc is None:
+            return
+        for term in doc["terms"]:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(course_id, None)
+                if not posting:
+                    del self.postings[term]
+
+    def search(self, query, limit=20):
+        """:return: [{"id": ..., "title": ..., "brief": ..., "score": ...}] 按分数从高到低"""
+        scores = defaultdict(float)
+        with self.lock:
+            total = len(self.docs) or 1
+            for term in set(tokenize(query, query=True)):
+                posting = self.postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + total / len(posting))
+                for course_id, weight in posting.items():
+                    scores[course_id] += weight * idf
+            top = heapq.nlargest(limit, ((score, course_id) for course_id, score in scores.items()))
+            return [{"id": course_id, "title": self.docs[course_id]["title"], "brief": self.docs[course_id]["brief"],
+                     "score": round(score, 4)} for score, course_id in top]
+
+    def rebuild(self, conn):
+        """从数据库重建, 先读取序号, 重建期间的修改之后再应用一次"""
+        seq = int(conn.get(SEQ_KEY) or 0)
+        fields = course_fields()
+        with self.lock:
+            self.postings = defaultdict(dict)
+            self.docs = {}
+            for course_id, course in fields.items():
+                self.add(course_id, course)
+            self.seq = seq
+
+    def apply_changes(self, conn):
+        """应用上次之后的修改, 没有修改时只有一次 redis 读取"""
+        changes = conn.zrangebyscore(CHANGES_KEY, "({}".format(self.seq), "+inf", withscores=True)
+        if not changes:
+            return 0
+        course_ids = [int(course_id) for course_id, _ in changes]
+        fields = course_fields(course_ids)
+        with self.lock:
+            for course_id in course_ids:
+                if course_id in fields:
+                    self.add(course_id, fields[course_id])
+                else:
+                    self.remove(course_id)
+            self.seq = max(self.seq, int(max(seq for _, seq in changes)))
+        return len(course_ids)
+
+    def save(self, path):
+        with self.lock:
+            data = pickle.dumps({"seq": self.seq, "docs": self.docs, "postings": dict(self.postings)},
+                                pickle.HIGHEST_PROTOCOL)
+        # 先写临时文件再替换, 其他进程不会读到写了一半的快照
+        tmp_path = "{}.{}".format(path, os.getpid())
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        with self.lock:
+            self.seq = data["seq"]
+            self.docs = data["docs"]
+            self.postings = defaultdict(dict, data["postings"])
+
+
+search_index = SearchIndex()
+_loaded = False
+_load_lock = threading.Lock()
+
+
+def mark_changed(conn, course_ids):
+    """课程修改, 所有进程在下次搜索时重新索引"""
+    if course_ids:
+        call_script(conn, MARK_CHANGED_LUA, [SEQ_KEY, CHANGES_KEY], list(course_ids))
+
+
+def ensure_loaded(conn):
+    """第一次搜索时加载快照, 没有快照从数据库重建"""
+    global _loaded
+    if _loaded:
+        return
+    with _load_lock:
+        if _loaded:
+            return
+        try:
+            search_index.load(settings.SEARCH_SNAPSHOT_PATH)
+        except (IOError, OSError, pickle.UnpicklingError, EOFError, KeyError):
+            search_index.rebuild(conn)
+        _loaded = True
+
+
+def search(conn, query, limit=20):
+    """:return: [{"id": ..., "title": ..., "brief": ..., "score": ...}]"""
+    ensure_loaded(conn)
+    search_index.apply_changes(conn)
+    return search_index.search(query, limit)
@@ -0,0 +1,206 @@
+from collections import OrderedDict
+
+from django.conf import settings
+
+from utils import codec
+from utils import price_policy
+from utils.lua_script import call_script
+
+"""
+购物车 / 结算在redis中的存储结构
+每个用户只有一个hash, 课程id作为field, 读取整个购物车只需要一次 hgetall
+购物车中只保存选择的价格策略以及价格策略快照的版本号, 课程名称和价格策略从 utils.price_policy 的快照中读取
+
+shoppingcar_<user_id> = {
+    course_id: codec.cart_item_codec.dumps({
+        "default_price_policy_id": policy_id,
+        "price_version": 加入购物车时价格策略快照的版本号,
+    }),
+    ...
+}
+
+gengeal_<user_id> = {
+    coupon_record_id: codec.account_codec.dumps({...}),
+}
+
+accountcoupon_<user_id> = {
+    course_id: codec.account_codec.dumps({
+        "course_info": {...},
+        "course_coupon_info": {...},
+    }),
+    ...
+}
+"""
+
+
+# 购物车修改的返回值
+CAR_OK = 1
+CAR_NOT_IN_CAR = 0
+CAR_SNAPSHOT_MISSING = -1
+CAR_POLICY_NOT_EXIST = -2
+CAR_COURSE_NOT_EXIST = -3
+
+# 加入购物车/修改价格策略
+# KEYS: 购物车, 价格策略快照, 价格策略版本号
+# ARGV: course_id, price_policy_id, 是否必须已经在购物车中, 购物车过期时间, 编码的版本号
+SET_POLICY_LUA = """
+if ARGV[3] == "1" and redis.call("HEXISTS", KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+local snapshot = redis.call("HMGET", KEYS[2], "version", "policies")
+local version = redis.call("GET", KEYS[3]) or "0"
+if not snapshot[1] or not snapshot[2] or snapshot[1] ~= version then
+    return -1
+end
+if not string.find(snapshot[2], "," .. ARGV[2] .. ",", 1, true) then
+    return -2
+end
+-- 和 codec.CartItemCodec 的格式相同
+redis.call("HSET", KEYS[1], ARGV[1], struct.pack(">BII", ARGV[5], tonumber(ARGV[2]), tonumber(version)))
+redis.call("EXPIRE", KEYS[1], ARGV[4])
+return 1
+"""
+
+# 从购物车中删除, 同时删除结算中心中的这门课程
+# KEYS: 购物车, 结算中心
+# ARGV: course_id
+REMOVE_LUA = """
+local removed = redis.call("HDEL", KEYS[1], ARGV[1])
+redis.call("HDEL", KEYS[2], ARGV[1])
+return removed
+"""
+
+
+class RedisHashStore(object):
+    """一个用户一个hash, field为课程id, value使用 codec 编码"""
+    key_format = None
+    ttl_setting = None
+    value_codec = None
+
+    def __init__(self, conn, user_id):
+        self.r = conn
+        self.user_id = user_id
+        self.key = self.key_format.format(user_id)
+        self.ttl = getattr(settings, self.ttl_setting)
+
+    def _read(self, command, *args):
+        """读取的同时刷新过期时间, 一次往返"""
+        pipe = self.r.pipeline(transaction=False)
+        getattr(pipe, command)(self.key, *args)
+        pipe.expire(self.key, self.ttl)
+        return pipe.execute()[0]
+
+    def loads(self, course_id, value):
+        return codec.loads(value)
+
+    def all(self):
+        """{course_id: dict}"""
+        return {field.decode("utf-8"): self.loads(field.decode("utf-8"), value)
+                for field, value in self._read("hgetall").items()}
+
+    def get_many(self, course_ids):
+        """一次 hmget 取出多个课程, 不存在的课程不返回"""
+        course_ids = [str(course_id) for course_id in course_ids]
+        if not course_ids:
+            return OrderedDict()
+        values = self._read("hmget", course_ids)
+        return OrderedDict((course_id, self.loads(course_id, value))
+                           for course_id, value in zip(course_ids, values) if value is not None)
+
+    def get(self, course_id):
+        value = self._read("hget", course_id)
+        if value is None:
+            return None
+        return self.loads(str(course_id), value)
+
+    def set(self, course_id, value):
+        """self.r 为管道时和管道中的其他命令一起执行"""
+        self.r.hset(self.key, course_id, self.value_codec.dumps(value))
+        self.r.expire(self.key, self.ttl)
+
+    def set_many(self, mapping):
+        if mapping:
+            self.r.hmset(self.key, {k: self.value_codec.dumps(v) for k, v in mapping.items()})
+            self.r.expire(self.key, self.ttl)
+
+    def clear(self):
+        self.r.delete(self.key)
+
+    def remove(self, course_id):
+        """删除成功返回True, 不存在返回False"""
+        return bool(self.r.hdel(self.key, course_id))
+
+
+class ShoppingCar(RedisHashStore):
+    """购物车"""
+    key_format = "shoppingcar_{}"
+    ttl_setting = "SHOPPINGCAR_TTL"
+    value_codec = codec.cart_item_codec
+
+    def loads(self, course_id, value):
+        item = codec.loads(value)
+        item["course_id"] = int(course_id)
+        return item
+
+    def hydrate(self, course_ids=None):
+        """
+        批量构建购物车数据
+        redis 一次取出所有课程, 价格策略快照一个管道取出, 不随购物车中课程的数量增加
+        :param course_ids: None 表示整个购物车
+        :return: {course_id: item}, 课程已经不存在的不返回
+        """
+        items = self.all() if course_ids is None else self.get_many(course_ids)
+        if not items:
+            return items
+        snapshots = price_policy.get_snapshots(self.r, items.keys())
+        hydrated = OrderedDict()
+        for course_id, item in items.items():
+            snapshot = snapshots.get(course_id)
+            if snapshot is None:
+                continue
+            item["course_title"] = snapshot["title"]
+            item["price_dict"] = snapshot["price_dict"]
+            # 加入购物车之后价格策略有修改
+            item["price_changed"] = item.get("price_version") != snapshot["version"]
+            item["price_version"] = snapshot["version"]
+            hydrated[course_id] = item
+        return hydrated
+
+    def set_policy(self, course_id, price_policy_id, must_exist=False):
+        """
+        加入购物车或者修改价格策略, 校验和写入在一个lua脚本中原子完成, 快照存在时只需要一次往返
+        :param must_exist: 修改价格策略时课程必须已经在购物车中
+        :return: CAR_* 返回值
+        """
+        try:
+            course_id, price_policy_id = int(course_id), int(price_policy_id)
+        except (TypeError, ValueError):
+            return CAR_COURSE_NOT_EXIST
+        keys = [self.key, price_policy.SNAPSHOT_KEY.format(course_id), price_policy.VERSION_KEY.format(course_id)]
+        args = [course_id, price_policy_id, "1" if must_exist else "0", self.ttl, self.value_codec.version]
+        ret = call_script(self.r, SET_POLICY_LUA, keys, args)
+        if ret == CAR_SNAPSHOT_MISSING:
+            # 快照不存在或者已经过期, 生成快照之后重试一次
+            if str(course_id) not in price_policy.get_snapshots(self.r, [course_id]):
+                return CAR_COURSE_NOT_EXIST
+            ret = call_script(self.r, SET_POLICY_LUA, keys, args)
+        return ret
+
+    def remove(self, course_id):
+        """从购物车和结算中心中删除, 删除成功返回True, 不存在返回False"""
+        return bool(call_script(self.r, REMOVE_LUA, [self.key, AccountCoupon.key_format.format(self.user_id)],
+                                [course_id]))
+
+
+class AccountCoupon(RedisHashStore):
+    """结算中心的课程以及课程优惠券"""
+    key_format = "accountcoupon_{}"
+    ttl_setting = "ACCOUNT_TTL"
+    value_codec = codec.account_codec
+
+
+class GengealCoupon(RedisHashStore):
+    """结算中心的通用优惠券, field为优惠券记录的id"""
+    key_format = "gengeal_{}"
+    ttl_setting = "ACCOUNT_TTL"
+    value_codec = codec.account_codec
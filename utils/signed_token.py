@@ -0,0 +1,55 @@
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.utils import baseconv
+
+from utils import token_cache
+
+"""
+无状态的签名token
+token = "<用户id>:<签发时间>:<签名>", 签名为 HMAC(SECRET_KEY), 由 django.core.signing.TimestampSigner 生成
+校验只需要计算签名和比较签发时间, 不访问数据库和redis; 需要提前失效的token放到吊销列表中(utils.token_cache)
+"""
+
+SALT = "luffy.token"
+
+signer = signing.TimestampSigner(salt=SALT)
+
+
+def make_token(user_id):
+    return signer.sign(str(user_id))
+
+
+def verify(token):
+    """签名正确, 没有过期, 没有被吊销返回用户id, 否则返回None"""
+    try:
+        user_id = signer.unsign(token, max_age=settings.TOKEN_EXPIRE)
+    except signing.BadSignature:
+        # 过期的 SignatureExpired 也是 BadSignature
+        return None
+    if token_cache.token_cache.is_revoked(token):
+        return None
+    return int(user_id)
+
+
+def issued_at(token):
+    """签名正确返回签发时间, 否则返回None"""
+    try:
+        signer.unsign(token)
+    except signing.BadSignature:
+        return None
+    # 用户id:签发时间(base62):签名
+    return baseconv.base62.decode(token.split(signer.sep)[1])
+
+
+def revoke(token):
+    """吊销签名token, 在吊销列表中保留到token本身过期; 签名不正确或者已经过期的不处理"""
+    issued = issued_at(token)
+    if issued is None:
+        return False
+    expire = issued + settings.TOKEN_EXPIRE
+    if expire <= time.time():
+        return False
+    token_cache.revoke_signed(token, expire)
+    return True
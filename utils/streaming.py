@@ -0,0 +1,46 @@
+import json
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+"""
+流式导出json数组
+queryset 可以是模型对象也可以是 values(), serializer_class 可以是 DRF 的序列化器也可以是 utils.fast_serializer
+按主键分批查询和序列化, 每批生成一段json写出, 内存只和每批的数量有关, 和表的大小无关
+django 1.11 的 iterator() 不支持 chunk_size 也不执行 prefetch_related, 所以按主键分批, 每批可以使用 prefetch_related
+"""
+
+
+def iter_chunks(queryset, chunk_size):
+    """按主键顺序分批取出, 每批一次查询(加上prefetch_related的查询)"""
+    last_pk = None
+    while True:
+        chunk_queryset = queryset.order_by("pk")
+        if last_pk is not None:
+            chunk_queryset = chunk_queryset.filter(pk__gt=last_pk)
+        rows = list(chunk_queryset[:chunk_size])
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        # values() 的字典需要包含 id
+        last_pk = rows[-1]["id"] if isinstance(rows[-1], dict) else rows[-1].pk
+
+
+def stream_json(queryset, serializer_class, chunk_size):
+    yield "["
+    first = True
+    for rows in iter_chunks(queryset, chunk_size):
+        data = json.dumps(serializer_class(rows, many=True).data, cls=JSONEncoder,
+                          ensure_ascii=False, separators=(",", ":"))
+        # 去掉每批的 "[" "]", 批之间用 "," 连接
+        yield ("" if first else ",") + data[1:-1]
+        first = False
+    yield "]"
+
+
+def streaming_response(queryset, serializer_class, chunk_size=None):
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    return StreamingHttpResponse(stream_json(queryset, serializer_class, chunk_size),
+                                 content_type="application/json")
@@ -0,0 +1,97 @@
+import time
+import uuid
+
+from django.conf import settings
+from django_redis import get_redis_connection
+from rest_framework.throttling import BaseThrottle
+
+from utils import token_store
+from utils.lua_script import call_script
+
+"""
+redis 滑动窗口限流, 每次检查一次lua调用
+throttle_<scope>_<ident> = zset {请求的唯一标识: 请求时间(毫秒)}
+
+视图中配置:
+    throttle_scope = "login"
+    throttle_classes = (IPThrottle, UsernameThrottle, TokenThrottle)
+次数和窗口在 settings.THROTTLE_RATES 中按 "<throttle_scope>_<ip|username|token>" 配置, 没有配置的不限流
+视图都列出三种限流, 按什么限流只由 settings 决定
+"""
+
+THROTTLE_KEY = "throttle_{}_{}"
+
+# KEYS: 限流的key
+# ARGV: 当前时间(毫秒), 窗口(毫秒), 窗口内最多请求次数, 本次请求的唯一标识
+# 返回 {是否允许, 需要等待的毫秒数}
+SLIDING_WINDOW_LUA = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", now - window)
+if redis.call("ZCARD", KEYS[1]) < tonumber(ARGV[3]) then
+    redis.call("ZADD", KEYS[1], now, ARGV[4])
+    redis.call("PEXPIRE", KEYS[1], window)
+    return {1, 0}
+end
+local oldest = redis.call("ZRANGE", KEYS[1], 0, 0, "WITHSCORES")
+return {0, tonumber(oldest[2]) + window - now}
+"""
+
+
+class RedisThrottle(BaseThrottle):
+    """子类实现 get_ident_value, 返回None表示不限流"""
+    kind = None
+
+    def __init__(self):
+        self.wait_ms = 0
+
+    def get_ident_value(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        scope = "{}_{}".format(getattr(view, "throttle_scope", None), self.kind)
+        rate = settings.THROTTLE_RATES.get(scope)
+        ident = self.get_ident_value(request, view)
+        if rate is None or not ident:
+            return True
+        limit, window = rate
+        now = int(time.time() * 1000)
+        allowed, self.wait_ms = call_script(get_redis_connection("default"), SLIDING_WINDOW_LUA,
+                                            [THROTTLE_KEY.format(scope, ident)],
+                                            [now, window * 1000, limit, "{}-{}".format(now, uuid.uuid4().hex[:8])])
+        return allowed == 1
+
+    def wait(self):
+        return self.wait_ms / 1000
+
+
+class IPThrottle(RedisThrottle):
+    """按客户端ip限流"""
+    kind = "ip"
+
+    def get_ident_value(self, request, view):
+        return self.get_ident(request)
+
+
+class UsernameThrottle(RedisThrottle):
+    """
+    按用户名限流, 登录注册按请求中的用户名, 字段由视图的 throttle_username_field 指定;
+    没有指定时按认证的用户
+    """
+    kind = "username"
+
+    def get_ident_value(self, request, view):
+        field = getattr(view, "throttle_username_field", None)
+        if field is None:
+            return getattr(request.user, "username", None)
+        username = request.data.get(field)
+        return username if isinstance(username, str) else None
+
+
+class TokenThrottle(RedisThrottle):
+    """按token限流, key中只保存token的摘要"""
+    kind = "token"
+
+    def get_ident_value(self, request, view):
+        token = request.META.get("HTTP_TOKEN")
+        return token_store.make_digest(token) if token else None
@@ -0,0 +1,119 @@
+from django.conf import settings
+
+from utils.lua_script import call_script
+
+"""
+有效token摘要的布隆过滤器, 保存在redis的一个bitmap中
+认证时缓存没有命中, 先查布隆过滤器, 不在过滤器中的token一定无效, 直接拒绝, 不查询数据库
+登录时把新token加入过滤器, rebuild_token_bloom 命令定期从 Token 表重建, 去掉过期和被替换的token
+过滤器不存在(还没有执行 rebuild_token_bloom 或者redis数据丢失)时不拒绝任何token, 全部查询数据库
+
+token_bloom = bitmap
+token_bloom_building = 重建期间的新bitmap, 重建完成后 rename 为 token_bloom
+token_bloom_stats = {
+    "checked": 查询次数,
+    "rejected": 过滤器拒绝的次数,
+    "false_positive": 通过过滤器但数据库中不存在的次数,
+}
+"""
+
+BLOOM_KEY = "token_bloom"
+BUILDING_KEY = "token_bloom_building"
+STATS_KEY = "token_bloom_stats"
+
+# 过滤器不存在(还没有建立或者redis数据丢失)
+BLOOM_MISSING = -1
+
+# 只写入已经存在的过滤器, 不能由 SETBIT 新建
+# 过滤器不存在时新建的过滤器中没有已有的token, 这些token会被拒绝, 不存在时只能由 rebuild 建立
+# KEYS: 过滤器, 重建中的过滤器
+# ARGV: 位置
+ADD_LUA = """
+local bloom = redis.call("EXISTS", KEYS[1]) == 1
+local building = redis.call("EXISTS", KEYS[2]) == 1
+for i = 1, #ARGV do
+    if bloom then
+        redis.call("SETBIT", KEYS[1], ARGV[i], 1)
+    end
+    if building then
+        redis.call("SETBIT", KEYS[2], ARGV[i], 1)
+    end
+end
+return 1
+"""
+
+# KEYS: 过滤器, 统计
+# ARGV: 位置
+CHECK_LUA = """
+if redis.call("EXISTS", KEYS[1]) == 0 then
+    return -1
+end
+redis.call("HINCRBY", KEYS[2], "checked", 1)
+for i = 1, #ARGV do
+    if redis.call("GETBIT", KEYS[1], ARGV[i]) == 0 then
+        redis.call("HINCRBY", KEYS[2], "rejected", 1)
+        return 0
+    end
+end
+return 1
+"""
+
+
+def positions(digest):
+    """double hashing, 摘要的前两个64位作为两个哈希值"""
+    h1 = int(digest[:16], 16)
+    h2 = int(digest[16:32], 16) | 1
+    return [(h1 + i * h2) % settings.TOKEN_BLOOM_BITS for i in range(settings.TOKEN_BLOOM_HASHES)]
+
+
+def add(conn, digest):
+    call_script(conn, ADD_LUA, [BLOOM_KEY, BUILDING_KEY], positions(digest))
+
+
+def might_contain(conn, digest):
+    """
+    :return: False 一定无效; True 可能有效; 过滤器不存在时返回 None, 需要查询数据库
+    """
+    ret = call_script(conn, CHECK_LUA, [BLOOM_KEY, STATS_KEY], positions(digest))
+    if ret == BLOOM_MISSING:
+        return None
+    return bool(ret)
+
+
+def record_false_positive(conn):
+    conn.hincrby(STATS_KEY, "false_positive", 1)
+
+
+def rebuild(conn, digests, batch_size=1000):
+    """
+    重建过滤器, 重建期间登录的token同时写入两个过滤器(ADD_LUA), 最后 rename 替换
+    :param digests: 所有有效token的摘要
+    :return: 加入的token数量
+    """
+    conn.delete(BUILDING_KEY)
+    # 先分配整个bitmap, 同时标记正在重建
+    conn.setbit(BUILDING_KEY, settings.TOKEN_BLOOM_BITS - 1, 0)
+    count = 0
+    pipe = conn.pipeline(transaction=False)
+    for digest in digests:
+        for position in positions(digest):
+            pipe.setbit(BUILDING_KEY, position, 1)
+        count += 1
+        if count % batch_size == 0:
+            pipe.execute()
+    pipe.execute()
+    conn.rename(BUILDING_KEY, BLOOM_KEY)
+    return count
+
+
+def get_stats(conn):
+    """
+    reject_rate: 过滤器拒绝的比例
+    false_positive_rate: 无效token中没有被过滤器拒绝的比例
+    """
+    stats = {"checked": 0, "rejected": 0, "false_positive": 0}
+    stats.update({field.decode("utf-8"): int(value) for field, value in conn.hgetall(STATS_KEY).items()})
+    checked, rejected, false_positive = stats["checked"], stats["rejected"], stats["false_positive"]
+    stats["reject_rate"] = rejected / checked if checked else 0
+    stats["false_positive_rate"] = false_positive / (rejected + false_positive) if rejected + false_positive else 0
+    return stats
@@ -0,0 +1,156 @@
+import time
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+"""
+token 的进程内缓存
+认证时先查进程内的 LRU 缓存, 没有再查 redis, 最后查数据库, 缓存中只保存用户id和用户名
+数据库token的缓存以token的摘要(utils.token_store.make_digest)作为key, 不保存token原文
+token 被刷新或者注销时通过 redis 的发布订阅通知所有进程删除本地缓存, 本地缓存的过期时间很短, 消息丢失时也只会短时间有效
+
+签名token(utils.signed_token)的吊销列表也通过同一个订阅线程同步到每个进程,
+token_revoked = zset {token: token的过期时间}, 订阅线程启动时加载, 之后通过 token_revoke 频道增量同步
+"""
+
+INVALIDATE_CHANNEL = "token_invalidate"
+REVOKE_CHANNEL = "token_revoke"
+REVOKED_KEY = "token_revoked"
+CACHE_KEY = "token_{}"
+
+
+class LocalTokenCache(object):
+    """进程内有容量上限和过期时间的 LRU 缓存"""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.data = OrderedDict()
+        # 吊销的签名token: {token: 过期时间}
+        self.revoked = {}
+        self.revoked_loaded = False
+        self.lock = threading.Lock()
+        self.listener = None
+
+    def get(self, token):
+        self.start_listener()
+        with self.lock:
+            item = self.data.get(token)
+            if item is None:
+                return None
+            identity, expire = item
+            if expire < time.time():
+                del self.data[token]
+                return None
+            self.data.move_to_end(token)
+            return identity
+
+    def set(self, token, identity, ttl=None):
+        ttl = self.ttl if ttl is None else min(self.ttl, ttl)
+        with self.lock:
+            self.data[token] = (identity, time.time() + ttl)
+            self.data.move_to_end(token)
+            while len(self.data) > self.max_size:
+                self.data.popitem(last=False)
+
+    def delete(self, token):
+        with self.lock:
+            self.data.pop(token, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def is_revoked(self, token):
+        self.start_listener()
+        expire = self.revoked.get(token)
+        if expire is None:
+            return False
+        if expire < time.time():
+            # token 本身已经过期, 不需要再保留
+            self.revoked.pop(token, None)
+        return True
+
+    def start_listener(self):
+        """每个进程一个订阅线程, 第一次使用缓存时启动"""
+        if self.listener is not None and self.listener.is_alive():
+            return
+        with self.lock:
+            if self.listener is not None and self.listener.is_alive():
+                return
+            if not self.revoked_loaded:
+                # 第一次回答之前同步加载吊销列表, 只由订阅线程加载时, 加载完成之前会接受已经吊销的token
+                self.revoked = self.load_revoked(get_redis_connection("default"))
+                self.revoked_loaded = True
+            self.listener = threading.Thread(target=self.listen, name="token-cache-listener")
+            self.listener.daemon = True
+            self.listener.start()
+
+    def load_revoked(self, conn):
+        """:return: {token: 过期时间}, 已经过期的不加载"""
+        return {token.decode("utf-8"): expire for token, expire in
+                conn.zrangebyscore(REVOKED_KEY, time.time(), "+inf", withscores=True)}
+
+    def listen(self):
+        while True:
+            try:
+                conn = get_redis_connection("default")
+                pubsub = conn.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATE_CHANNEL, REVOKE_CHANNEL)
+                # 重新订阅期间可能漏掉消息, 清空本地缓存, 重新加载吊销列表
+                self.clear()
+                self.revoked = self.load_revoked(conn)
+                for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    token = message["data"].decode("utf-8")
+                    if message["channel"].decode("utf-8") == REVOKE_CHANNEL:
+                        # "过期时间:token"
+                        expire, token = token.split(":", 1)
+                        self.revoked[token] = float(expire)
+                    self.delete(token)
+            except Exception:
+                time.sleep(1)
+
+
+token_cache = LocalTokenCache(settings.TOKEN_LOCAL_CACHE_SIZE, settings.TOKEN_LOCAL_CACHE_TTL)
+
+
+def get_identity(digest):
+    """先查进程内缓存, 再查redis, 返回 {"id": ..., "username": ...} 或者 None"""
+    identity = token_cache.get(digest)
+    if identity is not None:
+        return identity
+    identity = cache.get(CACHE_KEY.format(digest))
+    if identity is None:
+        return None
+    token_cache.set(digest, identity)
+    return identity
+
+
+def set_identity(digest, user, ttl):
+    identity = {"id": user.id, "username": user.username}
+    cache.set(CACHE_KEY.format(digest), identity, ttl)
+    token_cache.set(digest, identity, ttl)
+    return identity
+
+
+def revoke(digest):
+    """token 刷新或者注销, 删除 redis 缓存并通知所有进程删除本地缓存"""
+    token_cache.delete(digest)
+    cache.delete(CACHE_KEY.format(digest))
+    get_redis_connection("default").publish(INVALIDATE_CHANNEL, digest)
+
+
+def revoke_signed(token, expire):
+    """吊销签名token, 保留到token本身过期"""
+    conn = get_redis_connection("default")
+    pipe = conn.pipeline()
+    pipe.zremrangebyscore(REVOKED_KEY, "-inf", time.time())
+    pipe.zadd(REVOKED_KEY, {token: expire})
+    pipe.publish(REVOKE_CHANNEL, "{}:{}".format(expire, token))
+    pipe.execute()
+    token_cache.revoked[token] = expire
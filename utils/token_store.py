@@ -0,0 +1,53 @@
+import time
+import hashlib
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+from course.models import Token
+from utils import token_bloom
+
+"""
+数据库中的token
+token 原文只返回给客户端, 数据库, redis 以及进程内缓存都使用 sha256 摘要作为key
+"""
+
+
+def make_digest(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def issue(user_id, token):
+    """
+    保存用户新的token, 每个用户只有一个token
+    :return: 旧token的摘要, 没有返回None
+    """
+    digest = make_digest(token)
+    old_digest = Token.objects.filter(user_id=user_id).values_list("digest", flat=True).first()
+    Token.objects.update_or_create(user_id=user_id, defaults={
+        "digest": digest,
+        "expire_time": int(time.time()) + settings.TOKEN_EXPIRE,
+    })
+    token_bloom.add(get_redis_connection("default"), digest)
+    return old_digest
+
+
+def delete(digest):
+    """注销, 删除数据库中的token, :return: 是否删除"""
+    deleted, _ = Token.objects.filter(digest=digest).delete()
+    return bool(deleted)
+
+
+def lookup(digest):
+    """
+    按摘要查找没有过期的token, 走唯一索引
+    不在布隆过滤器中的token一定无效, 不查询数据库
+    """
+    conn = get_redis_connection("default")
+    might_contain = token_bloom.might_contain(conn, digest)
+    if might_contain is False:
+        return None
+    token_obj = Token.objects.filter(digest=digest, expire_time__gt=int(time.time())).select_related("user").first()
+    if token_obj is None and might_contain:
+        token_bloom.record_false_positive(conn)
+    return token_obj
@@ -0,0 +1,55 @@
+import time
+
+"""
+资源的版本号, 模型修改时通过信号+1
+缓存的key中带上版本号, 版本号变化之后旧缓存不会再被读取, 等待过期即可, 不需要逐个删除
+
+version_<resource> = {
+    "version": 版本号,
+    "modified": 最后修改的时间戳,
+}
+"""
+
+VERSION_KEY = "version_{}"
+
+# 课程列表, 所有分类共用一个版本号
+CATALOG = "catalog"
+# 课程分类
+CATEGORY = "category"
+# 课程详细页面文档, 文档重建时+1
+COURSE_DOC = "coursedoc_{}"
+# 课程的章节和课时
+CHAPTER = "chapter_{}"
+
+
+def bump(conn, *resources):
+    pipe = conn.pipeline(transaction=False)
+    touch(pipe, *resources)
+    pipe.execute()
+
+
+def touch(conn, *resources):
+    """同 bump, conn 为管道时和管道中的其他命令一起执行"""
+    now = time.time()
+    for resource in resources:
+        conn.hincrby(VERSION_KEY.format(resource), "version", 1)
+        conn.hset(VERSION_KEY.format(resource), "modified", now)
+
+
+def get_version(conn, resource):
+    """没有修改过的资源版本号为0"""
+    return int(conn.hget(VERSION_KEY.format(resource), "version") or 0)
+
+
+def get_info(conn, resource):
+    """:return: (版本号, 最后修改的时间戳), 没有修改过的返回 (0, None)"""
+    version, modified = conn.hmget(VERSION_KEY.format(resource), "version", "modified")
+    return int(version or 0), float(modified) if modified else None
+
+
+def get_info_many(conn, resources):
+    """一次往返读取多个资源, :return: [(版本号, 最后修改的时间戳), ...]"""
+    pipe = conn.pipeline(transaction=False)
+    for resource in resources:
+        pipe.hmget(VERSION_KEY.format(resource), "version", "modified")
+    return [(int(version or 0), float(modified) if modified else None) for version, modified in pipe.execute()]